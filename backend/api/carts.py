@@ -0,0 +1,113 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum
+
+from api.constant import CART_VERSION
+from api.versions import bump_version
+from recipes.models import AmountIngredient, CartIngredient, Carts
+
+
+def apply_cart_deltas(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in CartIngredient.objects.select_for_update().filter(
+            user__in={user_id for user_id, _ in deltas},
+            ingredient__in={ingredient_id for _, ingredient_id in deltas},
+        )
+    }
+    created, changed, deleted = [], [], []
+    for (user_id, ingredient_id), (amount, recipes) in deltas.items():
+        row = rows.get((user_id, ingredient_id))
+        if row is None:
+            if recipes > 0:
+                created.append(
+                    CartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=max(amount, 0),
+                        recipes_count=recipes,
+                    )
+                )
+            continue
+        row.amount = max(row.amount + amount, 0)
+        row.recipes_count += recipes
+        if row.recipes_count > 0:
+            changed.append(row)
+        else:
+            deleted.append(row.pk)
+    CartIngredient.objects.bulk_create(created)
+    CartIngredient.objects.bulk_update(changed, ("amount", "recipes_count"))
+    if deleted:
+        CartIngredient.objects.filter(pk__in=deleted).delete()
+    bump_version(
+        *{CART_VERSION.format(user_id) for user_id, _ in deltas}
+    )
+
+
+def carts_changed(user_id, recipe_ids, sign):
+    deltas = defaultdict(lambda: [0, 0])
+    for ingredient_id, amount in AmountIngredient.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list("ingredients_id", "amount"):
+        delta = deltas[(user_id, ingredient_id)]
+        delta[0] += sign * amount
+        delta[1] += sign
+    apply_cart_deltas(deltas)
+
+
+def recipe_removed_from_carts(recipe):
+    deltas = {}
+    amounts = list(
+        AmountIngredient.objects.filter(recipe=recipe).values_list(
+            "ingredients_id", "amount"
+        )
+    )
+    for user_id in Carts.objects.filter(recipe=recipe).values_list(
+        "user_id", flat=True
+    ):
+        for ingredient_id, amount in amounts:
+            deltas[(user_id, ingredient_id)] = (-amount, -1)
+    apply_cart_deltas(deltas)
+
+
+def recipe_amounts_changed(recipe, old, new):
+    changes = {
+        ingredient_id: (
+            new.get(ingredient_id, 0) - old.get(ingredient_id, 0),
+            (ingredient_id in new) - (ingredient_id in old),
+        )
+        for ingredient_id in old.keys() | new.keys()
+    }
+    changes = {key: delta for key, delta in changes.items() if any(delta)}
+    if not changes:
+        return
+    apply_cart_deltas(
+        {
+            (user_id, ingredient_id): delta
+            for user_id in Carts.objects.filter(recipe=recipe).values_list(
+                "user_id", flat=True
+            )
+            for ingredient_id, delta in changes.items()
+        }
+    )
+
+
+def compute_cart_ingredients(user_ids):
+    return {
+        (row["user_id"], row["ingredient_id"]): (
+            row["amount"],
+            row["recipes_count"],
+        )
+        for row in Carts.objects.filter(
+            user__in=user_ids, recipe__ingredient__isnull=False
+        )
+        .values("user_id", ingredient_id=F("recipe__ingredient__ingredients"))
+        .annotate(
+            amount=Sum("recipe__ingredient__amount"),
+            recipes_count=Count("recipe"),
+        )
+        .order_by()
+    }
@@ -0,0 +1,173 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+
+from api.constant import CATALOG_VERSION
+from api.versions import get_versions
+from recipes.models import Ingredient, Tag
+
+
+class CatalogSnapshot:
+    def __init__(self, tags, ingredients):
+        self.tags = tuple(
+            {
+                "id": tag.id,
+                "name": tag.name,
+                "color": tag.color,
+                "slug": tag.slug,
+            }
+            for tag in tags
+        )
+        self.tag_objects = {tag.id: tag for tag in tags}
+        self.tag_slugs = {tag["slug"]: tag["id"] for tag in self.tags}
+        self.tag_positions = {
+            tag["id"]: position for position, tag in enumerate(self.tags)
+        }
+        self.ingredients = ingredients
+        self.ingredient_positions = {
+            ingredient["id"]: position
+            for position, ingredient in enumerate(ingredients)
+        }
+        self.names = tuple(
+            sorted(
+                (ingredient["name"].casefold(), position)
+                for position, ingredient in enumerate(ingredients)
+            )
+        )
+
+
+class Catalog:
+    def __init__(self):
+        self.lock = Lock()
+        self.checked = None
+        self.forced = None
+        self.version = None
+        self.snapshot = CatalogSnapshot((), ())
+
+    def is_recent(self, checked, now):
+        return (
+            checked is not None
+            and now - checked < settings.CATALOG_CHECK_INTERVAL
+        )
+
+    def needs_refresh(self, force, now):
+        if force and not self.is_recent(self.forced, now):
+            return True
+        return not self.is_recent(self.checked, now)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not self.needs_refresh(force, now):
+            return
+
+        with self.lock:
+            if not self.needs_refresh(force, now):
+                return
+            version = get_versions(CATALOG_VERSION)[CATALOG_VERSION]
+            if self.version is None or version[0] != self.version[0]:
+                self.snapshot = CatalogSnapshot(
+                    tuple(Tag.objects.all()),
+                    tuple(
+                        Ingredient.objects.values(
+                            "id", "name", "measurement_unit"
+                        )
+                    ),
+                )
+            self.version = version
+            self.checked = now
+            if force:
+                self.forced = now
+
+    def get_snapshot(self, mapping=None, keys=()):
+        self.refresh()
+        snapshot = self.snapshot
+        if mapping is not None and any(
+            key not in getattr(snapshot, mapping) for key in keys
+        ):
+            self.refresh(force=True)
+            snapshot = self.snapshot
+        return snapshot
+
+    def lookup(self, mapping, pk):
+        return getattr(self.get_snapshot(mapping, (pk,)), mapping).get(pk)
+
+    def get_version(self):
+        self.refresh()
+        return self.version
+
+    def get_tags(self):
+        return list(self.get_snapshot().tags)
+
+    def get_tag(self, pk):
+        snapshot = self.get_snapshot("tag_positions", (pk,))
+        position = snapshot.tag_positions.get(pk)
+        return None if position is None else snapshot.tags[position]
+
+    def get_tag_object(self, pk):
+        return self.lookup("tag_objects", pk)
+
+    def get_tag_id(self, slug):
+        return self.lookup("tag_slugs", slug)
+
+    def get_ingredient(self, pk):
+        snapshot = self.get_snapshot("ingredient_positions", (pk,))
+        position = snapshot.ingredient_positions.get(pk)
+        return None if position is None else snapshot.ingredients[position]
+
+    def sort_tags(self, pks):
+        snapshot = self.get_snapshot("tag_positions", pks)
+        positions = snapshot.tag_positions
+        return [
+            snapshot.tags[position]
+            for position in sorted(
+                positions[pk] for pk in pks if pk in positions
+            )
+        ]
+
+    def sort_ingredients(self, amounts):
+        amounts = dict(amounts)
+        snapshot = self.get_snapshot("ingredient_positions", amounts)
+        positions = snapshot.ingredient_positions
+        ingredients = [
+            snapshot.ingredients[position]
+            for position in sorted(
+                positions[pk] for pk in amounts if pk in positions
+            )
+        ]
+        missing = [pk for pk in amounts if pk not in positions]
+        if missing:
+            ingredients.extend(
+                Ingredient.objects.filter(pk__in=missing).values(
+                    "id", "name", "measurement_unit"
+                )
+            )
+        return [
+            {**ingredient, "amount": amounts[ingredient["id"]]}
+            for ingredient in ingredients
+        ]
+
+    def search_ingredients(self, name=None, measurement_unit=None):
+        snapshot = self.get_snapshot()
+        ingredients, names = snapshot.ingredients, snapshot.names
+        if name:
+            prefix = name.casefold()
+            positions = []
+            for index in range(bisect_left(names, (prefix,)), len(names)):
+                folded, position = names[index]
+                if not folded.startswith(prefix):
+                    break
+                positions.append(position)
+            positions.sort()
+            ingredients = [ingredients[position] for position in positions]
+        if measurement_unit:
+            ingredients = [
+                ingredient
+                for ingredient in ingredients
+                if ingredient["measurement_unit"] == measurement_unit
+            ]
+        return list(ingredients)
+
+
+catalog = Catalog()
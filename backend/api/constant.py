@@ -1,2 +1,8 @@
 ONE_TRUE_CONST = "1", "true"
 ZERO_FALSE_CONST = "0", "false"
+BULK_LIMIT_MAX = 100
+
+CATALOG_VERSION = "catalog"
+RECIPES_VERSION = "recipes"
+USER_VERSION = "user:{}"
+CART_VERSION = "cart:{}"
@@ -0,0 +1,138 @@
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F
+
+from api.pools import submit_to_pool
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscriptions
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+def is_pull_author(author):
+    return author.feed_pull
+
+
+def add_to_feeds(user_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id in user_ids
+            for recipe_id, pub_date in recipes
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_recipe(recipe):
+    if recipe.author is None or is_pull_author(recipe.author):
+        return
+    add_to_feeds(
+        Subscriptions.objects.filter(author=recipe.author).values_list(
+            "user_id", flat=True
+        ),
+        ((recipe.pk, recipe.pub_date),),
+    )
+
+
+def get_latest_recipes(author):
+    return (
+        Recipe.objects.filter(author=author)
+        .order_by("-pub_date", "-id")
+        .values_list("id", "pub_date")[: settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def backfill_feed(user, author):
+    if is_pull_author(author):
+        return
+    add_to_feeds((user.pk,), get_latest_recipes(author))
+
+
+def update_feed_modes(authors):
+    User.objects.filter(
+        pk__in=authors,
+        feed_pull=False,
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).update(feed_pull=True)
+    resumed = list(
+        User.objects.filter(
+            pk__in=authors,
+            feed_pull=True,
+            subscribers_count__lte=settings.FEED_FANOUT_RESUME_LIMIT,
+        ).values_list("pk", flat=True)
+    )
+    if resumed:
+        transaction.on_commit(
+            partial(
+                submit_to_pool,
+                "feed-backfill",
+                settings.FEED_BACKFILL_WORKERS,
+                run_backfill,
+                resumed,
+            )
+        )
+
+
+def backfill_followers(authors):
+    for author in authors:
+        with transaction.atomic():
+            if not User.objects.filter(
+                pk=author,
+                feed_pull=True,
+                subscribers_count__lte=settings.FEED_FANOUT_RESUME_LIMIT,
+            ).update(feed_pull=False):
+                continue
+            add_to_feeds(
+                Subscriptions.objects.filter(author=author).values_list(
+                    "user_id", flat=True
+                ),
+                list(get_latest_recipes(author)),
+            )
+
+
+def run_backfill(authors):
+    try:
+        backfill_followers(authors)
+    except Exception:
+        logger.exception("Не удалось заполнить ленты подписчиков %s", authors)
+    finally:
+        connections.close_all()
+
+
+def subscribe_feed(user, author):
+    update_feed_modes((author.pk,))
+    author.refresh_from_db(fields=("feed_pull",))
+    backfill_feed(user, author)
+
+
+def trim_feed(user, author):
+    FeedEntry.objects.filter(user=user, recipe__author=author).delete()
+
+
+def unsubscribe_feed(user, author):
+    trim_feed(user, author)
+    update_feed_modes((author,))
+
+
+def get_feed_sources(user):
+    sources = [FeedEntry.objects.filter(user=user)]
+    pull_authors = list(
+        User.objects.filter(
+            subscribers__user=user, feed_pull=True
+        ).values_list("pk", flat=True)
+    )
+    if pull_authors:
+        sources.append(
+            Recipe.objects.annotate(recipe_id=F("pk")).filter(
+                author__in=pull_authors
+            )
+        )
+    return sources
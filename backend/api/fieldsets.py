@@ -0,0 +1,62 @@
+FIELDS_QUERY_PARAM = "fields"
+OMIT_QUERY_PARAM = "omit"
+
+
+def parse_fields(value):
+    tree = {}
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names):
+            continue
+        node = tree
+        for name in names[:-1]:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def dump_fields(tree):
+    return ",".join(
+        name if subtree is None else f"{name}({dump_fields(subtree)})"
+        for name, subtree in sorted(tree.items())
+    )
+
+
+class Fieldset:
+    def __init__(self, selected=None, omitted=None):
+        self.selected = selected
+        self.omitted = omitted or {}
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method != "GET":
+            return cls()
+        selected = parse_fields(
+            request.query_params.get(FIELDS_QUERY_PARAM, "")
+        )
+        omitted = parse_fields(request.query_params.get(OMIT_QUERY_PARAM, ""))
+        return cls(selected or None, omitted)
+
+    @property
+    def key(self):
+        if self.selected is None and not self.omitted:
+            return ""
+        selected = "*" if self.selected is None else dump_fields(self.selected)
+        return f"{selected}-{dump_fields(self.omitted)}"
+
+    def includes(self, name):
+        if name in self.omitted and self.omitted[name] is None:
+            return False
+        return self.selected is None or name in self.selected
+
+    def includes_nested(self, name, nested_name):
+        return self.includes(name) and self.nested(name).includes(nested_name)
+
+    def nested(self, name):
+        selected = None
+        if self.selected is not None:
+            selected = self.selected.get(name)
+        return Fieldset(selected, self.omitted.get(name))
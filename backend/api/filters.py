@@ -1,31 +1,72 @@
 import django_filters
-from django.contrib.auth import get_user_model
+from django import forms
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.catalog import catalog
+from api.constant import ONE_TRUE_CONST, ZERO_FALSE_CONST
+from recipes.models import Carts, Favorites, Recipe
+from recipes.search import search_recipes
 
-User = get_user_model()
 
+class SlugListField(forms.MultipleChoiceField):
+    def valid_value(self, value):
+        return True
 
-class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(
-        field_name="name", lookup_expr="istartswith"
-    )
 
-    class Meta:
-        model = Ingredient
-        fields = ("name", "measurement_unit")
+class SlugListFilter(django_filters.MultipleChoiceFilter):
+    field_class = SlugListField
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
-    )
-    author = django_filters.ModelChoiceFilter(
-        queryset=User.objects.all(),
+    search = django_filters.CharFilter(method="filter_search")
+    tags = SlugListFilter(method="filter_tags")
+    author = django_filters.NumberFilter(field_name="author")
+    is_favorited = django_filters.CharFilter(method="filter_is_favorited")
+    is_in_shopping_cart = django_filters.CharFilter(
+        method="filter_is_in_shopping_cart"
     )
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author")
+        fields = (
+            "search",
+            "tags",
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+        )
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = [catalog.get_tag_id(slug) for slug in value]
+        tag_ids = [tag_id for tag_id in tag_ids if tag_id is not None]
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"), tag_id__in=tag_ids
+                )
+            )
+        )
+
+    def filter_linked(self, queryset, linked_model, value):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        linked = Exists(
+            linked_model.objects.filter(user=user, recipe=OuterRef("pk"))
+        )
+        if value in ONE_TRUE_CONST:
+            return queryset.filter(linked)
+        if value in ZERO_FALSE_CONST:
+            return queryset.filter(~linked)
+        return queryset
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_linked(queryset, Favorites, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_linked(queryset, Carts, value)
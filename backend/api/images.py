@@ -0,0 +1,139 @@
+import base64
+import logging
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps
+
+from api.constant import RECIPES_VERSION
+from api.pools import submit_to_pool
+from api.versions import bump_version
+from recipes.models import Recipe
+from recipes.storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = (("webp", "WEBP"), ("jpeg", "JPEG"))
+VARIANTS_PATH = "recipe_images/variants"
+PLACEHOLDER_WIDTH = 16
+LANCZOS = getattr(Image, "Resampling", Image).LANCZOS
+
+
+def open_image(name):
+    with content_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        transparent = (
+            "A" in image.getbands() or "transparency" in image.info
+        )
+        image = image.convert("RGBA" if transparent else "RGB")
+    return image
+
+
+def strip_metadata(file):
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    if getattr(image, "is_animated", False):
+        file.seek(0)
+        return file
+    options = {}
+    if "transparency" in image.info:
+        options["transparency"] = image.info["transparency"]
+    if image_format == "JPEG":
+        options["quality"] = settings.RECIPE_IMAGE_ORIGINAL_QUALITY
+    image = ImageOps.exif_transpose(image)
+    image.info = {}
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def flatten(image):
+    if image.mode == "RGB":
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), LANCZOS)
+
+
+def encode(image, image_format, **options):
+    buffer = BytesIO()
+    if image_format == "JPEG":
+        image = flatten(image)
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(name):
+    image = open_image(name)
+    variants = {}
+    for variant, width in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = resize(image, width)
+        variants[variant] = {
+            "width": resized.width,
+            "height": resized.height,
+        }
+        for extension, image_format in IMAGE_FORMATS:
+            content = encode(
+                resized,
+                image_format,
+                quality=settings.RECIPE_IMAGE_QUALITY,
+                optimize=True,
+            )
+            variants[variant][extension] = content_storage.save(
+                f"{VARIANTS_PATH}/{variant}.{extension}", ContentFile(content)
+            )
+
+    placeholder = resize(image, PLACEHOLDER_WIDTH).filter(
+        ImageFilter.GaussianBlur(1)
+    )
+    placeholder = base64.b64encode(encode(placeholder, "WEBP", quality=40))
+    return variants, f"data:image/webp;base64,{placeholder.decode()}"
+
+
+def process_recipe_image(pk, name):
+    variants, placeholder = build_variants(name)
+    updated = Recipe.objects.filter(pk=pk, image=name).update(
+        image_variants=variants,
+        image_placeholder=placeholder,
+        modified=timezone.now(),
+    )
+    if updated:
+        bump_version(RECIPES_VERSION)
+    return updated
+
+
+def run_in_worker(pk, name):
+    try:
+        process_recipe_image(pk, name)
+    except Exception:
+        logger.exception("Не удалось обработать изображение рецепта %s", pk)
+    finally:
+        connections.close_all()
+
+
+def schedule_image_processing(recipe):
+    transaction.on_commit(
+        partial(
+            submit_to_pool,
+            "recipe-images",
+            settings.RECIPE_IMAGE_WORKERS,
+            run_in_worker,
+            recipe.pk,
+            recipe.image.name,
+        )
+    )
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.carts import compute_cart_ingredients
+from recipes.models import CartIngredient
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает ингредиенты списков покупок с нуля и сравнивает "
+        "с сохранёнными. С флагом --fix исправляет расхождения. "
+        ">>> python manage.py checkcartingredients --fix"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="количество пользователей, проверяемых за одну транзакцию",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="исправить найденные расхождения",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = drifted = last_pk = 0
+        while True:
+            with transaction.atomic():
+                user_ids = list(
+                    User.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                if not user_ids:
+                    break
+                last_pk = user_ids[-1]
+                drift = self.check_users(user_ids, options["fix"])
+            checked += len(user_ids)
+            drifted += len(drift)
+            for (user_id, ingredient_id), actual, expected in drift:
+                self.stdout.write(
+                    f"Пользователь {user_id}, ингредиент {ingredient_id}: "
+                    f"сохранено {actual}, должно быть {expected}"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пользователей проверено: {checked}, "
+                f"расхождений: {drifted}"
+                + (", исправлено" if options["fix"] and drifted else "")
+            )
+        )
+
+    def check_users(self, user_ids, fix):
+        expected = compute_cart_ingredients(user_ids)
+        rows = {
+            (row.user_id, row.ingredient_id): row
+            for row in CartIngredient.objects.select_for_update().filter(
+                user__in=user_ids
+            )
+        }
+        drift = []
+        for key in rows.keys() | expected.keys():
+            row = rows.get(key)
+            actual = (row.amount, row.recipes_count) if row else None
+            if actual != expected.get(key):
+                drift.append((key, actual, expected.get(key)))
+        if fix and drift:
+            CartIngredient.objects.filter(
+                pk__in=[rows[key].pk for key, _, _ in drift if key in rows]
+            ).delete()
+            CartIngredient.objects.bulk_create(
+                CartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=value[0],
+                    recipes_count=value[1],
+                )
+                for (user_id, ingredient_id), _, value in drift
+                if value is not None
+            )
+        return sorted(drift)
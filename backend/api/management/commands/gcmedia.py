@@ -0,0 +1,111 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.images import IMAGE_FORMATS
+from recipes.models import Recipe
+from recipes.storage import content_storage
+
+MEDIA_PATH = "recipe_images"
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет файлы изображений рецептов, на которые не ссылается ни "
+        "один рецепт. Недавно записанные файлы не трогает. "
+        ">>> python manage.py gcmedia"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько рецептов читать и файлов удалять за раз.",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.MEDIA_GC_GRACE,
+            help="Не удалять файлы моложе указанного числа секунд.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет удалено.",
+        )
+
+    def count_references(self, recipes, batch_size):
+        references = Counter()
+        for image, variants in recipes.values_list(
+            "image", "image_variants"
+        ).iterator(chunk_size=batch_size):
+            references[image] += 1
+            for variant in variants.values():
+                for extension, _ in IMAGE_FORMATS:
+                    references[variant[extension]] += 1
+        return references
+
+    def handle(self, *args, **options):
+        if not content_storage.exists(MEDIA_PATH):
+            self.stdout.write(
+                self.style.SUCCESS("Файлов изображений рецептов нет")
+            )
+            return
+
+        batch_size = options["batch_size"]
+        started = timezone.now()
+        references = self.count_references(Recipe.objects.all(), batch_size)
+        threshold = started - timedelta(seconds=options["grace"])
+
+        batch, deleted, freed = [], 0, 0
+        for name in content_storage.walk(MEDIA_PATH):
+            if references[name]:
+                continue
+            if content_storage.get_modified_time(name) > threshold:
+                continue
+            batch.append(name)
+            if len(batch) >= batch_size:
+                count, size = self.delete(batch, started, threshold, options)
+                deleted, freed = deleted + count, freed + size
+                batch = []
+        count, size = self.delete(batch, started, threshold, options)
+        deleted, freed = deleted + count, freed + size
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Файлов с ссылками: {len(references)}, "
+                f"удалено: {deleted}, освобождено байт: {freed}"
+            )
+        )
+
+    def delete(self, names, started, threshold, options):
+        if not names:
+            return 0, 0
+        references = self.count_references(
+            Recipe.objects.filter(modified__gte=started), options["batch_size"]
+        )
+        references.update(
+            Recipe.objects.filter(image__in=names).values_list(
+                "image", flat=True
+            )
+        )
+        deleted, freed = 0, 0
+        for name in names:
+            if references[name]:
+                continue
+            try:
+                if content_storage.get_modified_time(name) > threshold:
+                    continue
+                size = content_storage.size(name)
+            except FileNotFoundError:
+                continue
+            if options["dry_run"]:
+                self.stdout.write(name)
+            else:
+                content_storage.delete(name)
+            deleted, freed = deleted + 1, freed + size
+        return deleted, freed
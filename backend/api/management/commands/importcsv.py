@@ -1,15 +1,48 @@
 import csv
 import os
+from itertools import islice
 
 from django.apps import apps
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import (DataError, IntegrityError, connections, router,
+                       transaction)
+
+from api.constant import CATALOG_VERSION
+from api.versions import bump_version
+
+IMPORTS = {
+    "Ingredient": (("name", "measurement_unit"), ("name", "measurement_unit")),
+    "Tag": (("name", "color", "slug"), ("slug",)),
+}
+
+
+class RowsFile:
+    def __init__(self, rows):
+        self.rows = rows
+        self.data = ""
+        self.writer = csv.writer(self)
+
+    def write(self, value):
+        self.data += value
+
+    def read(self, size=-1):
+        while size < 0 or len(self.data) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        if size < 0:
+            size = len(self.data)
+        data, self.data = self.data[:size], self.data[size:]
+        return data
 
 
 class Command(BaseCommand):
     help = (
         "Команда для заполнения данными БД ингредиентам "
-        "или тегами из CSV файла. "
+        "или тегами из CSV файла. Существующие записи обновляются "
+        "по естественному ключу, ссылки на них сохраняются. "
         "Для ингредиентов: "
         ">>> python manage.py importcsv "
         "--filename 'ingredients.csv' "
@@ -31,6 +64,12 @@ class Command(BaseCommand):
             type=str,
             help="название модели  (Ingredient или Tag)",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="количество строк, обрабатываемых за один запрос",
+        )
 
     def get_csv_file(self, filename):
         return os.path.join(settings.BASE_DIR, "data", filename)
@@ -38,28 +77,149 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         filename = options["filename"]
         model_name = options["model_name"]
+        if model_name not in IMPORTS:
+            raise CommandError(
+                f"Модель {model_name} не поддерживается, "
+                f"доступны: {', '.join(IMPORTS)}"
+            )
         file_path = self.get_csv_file(filename)
         self.stdout.write(self.style.SUCCESS(f"Чтение: {file_path}"))
         _model = apps.get_model("recipes", model_name)
-        _model.objects.all().delete()
+        fields, keys = IMPORTS[model_name]
+        using = router.db_for_write(_model)
+        self.malformed = 0
         try:
             with open(file_path, "r", encoding="utf-8") as csv_file:
-                reader = csv.reader(csv_file, delimiter=",")
-                bulk_create_data = (
-                    _model(name=row[0], measurement_unit=row[1])
-                    for row in reader
-                )
-                if "tags.csv" in filename:
-                    bulk_create_data = (
-                        _model(name=row[0], color=row[1], slug=row[2])
-                        for row in reader
-                    )
-                _model.objects.bulk_create(bulk_create_data)
-                line_count = _model.objects.count()
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"{line_count} данные добавлены в {model_name}"
-                )
-            )
+                rows = self.read_rows(csv_file, fields)
+                with transaction.atomic(using=using):
+                    if connections[using].vendor == "postgresql":
+                        created, updated, total = self.copy_upsert(
+                            _model, fields, keys, rows, using
+                        )
+                    else:
+                        created, updated, total = self.batch_upsert(
+                            _model, fields, keys, rows, options["batch_size"]
+                        )
+                    bump_version(CATALOG_VERSION)
         except FileNotFoundError:
             raise CommandError(f"Файл {file_path} не найден")
+        except (csv.Error, DataError, IntegrityError) as error:
+            raise CommandError(
+                f"Файл {file_path} не импортирован, изменения отменены: "
+                f"{error}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{model_name}: строк {total}, добавлено {created}, "
+                f"обновлено {updated}, без изменений "
+                f"{total - created - updated}, "
+                f"пропущено некорректных {self.malformed}"
+            )
+        )
+
+    def read_rows(self, csv_file, fields):
+        reader = csv.reader(csv_file, delimiter=",")
+        for row in reader:
+            if not row:
+                continue
+            if len(row) == len(fields):
+                yield row
+                continue
+            self.malformed += 1
+            self.stderr.write(
+                f"Строка {reader.line_num}: ожидалось полей {len(fields)}, "
+                f"получено {len(row)}"
+            )
+
+    def batch_upsert(self, model, fields, keys, rows, batch_size):
+        created = updated = total = 0
+        while True:
+            batch = {}
+            for row in islice(rows, batch_size):
+                values = dict(zip(fields, row))
+                batch[tuple(values[key] for key in keys)] = values
+            if not batch:
+                break
+            candidates = model.objects.filter(
+                **{f"{keys[0]}__in": {key[0] for key in batch}}
+            )
+            existing = {
+                tuple(getattr(obj, name) for name in keys): obj
+                for obj in candidates
+            }
+            existing = {
+                key: obj for key, obj in existing.items() if key in batch
+            }
+            changed = []
+            for key, values in batch.items():
+                obj = existing.get(key)
+                if obj is None:
+                    continue
+                if any(getattr(obj, name) != values[name] for name in fields):
+                    for name in fields:
+                        setattr(obj, name, values[name])
+                    changed.append(obj)
+            model.objects.bulk_create(
+                model(**values)
+                for key, values in batch.items()
+                if key not in existing
+            )
+            if changed:
+                model.objects.bulk_update(changed, fields)
+            created += len(batch) - len(existing)
+            updated += len(changed)
+            total += len(batch)
+            self.stdout.write(f"Обработано строк: {total}")
+        return created, updated, total
+
+    def copy_upsert(self, model, fields, keys, rows, using):
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = ", ".join(quote(name) for name in fields)
+        conflict = ", ".join(quote(name) for name in keys)
+        values = [quote(name) for name in fields if name not in keys]
+        action = "NOTHING"
+        if values:
+            current = ", ".join(f"{table}.{name}" for name in values)
+            excluded = ", ".join(f"EXCLUDED.{name}" for name in values)
+            action = (
+                f"UPDATE SET ({', '.join(values)}) = ROW({excluded}) "
+                f"WHERE ({current}) IS DISTINCT FROM ({excluded})"
+            )
+        staging = ", ".join(f"{quote(name)} text" for name in fields)
+        not_null = ", ".join(
+            quote(name)
+            for name in fields
+            if model._meta.get_field(name).empty_strings_allowed
+        )
+        options = "FORMAT csv"
+        if not_null:
+            options += f", FORCE_NOT_NULL ({not_null})"
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE import_staging ({staging}) ON COMMIT DROP"
+            )
+            with connection.wrap_database_errors:
+                cursor.copy_expert(
+                    f"COPY import_staging ({columns}) FROM STDIN "
+                    f"WITH ({options})",
+                    RowsFile(rows),
+                )
+            cursor.execute(
+                f"SELECT COUNT(DISTINCT ({conflict})) FROM import_staging"
+            )
+            total = cursor.fetchone()[0]
+            self.stdout.write(f"Загружено строк: {total}")
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"SELECT DISTINCT ON ({conflict}) {columns} "
+                f"FROM import_staging ORDER BY {conflict} "
+                f"ON CONFLICT ({conflict}) DO {action} "
+                "RETURNING (xmax = 0)"
+            )
+            inserted = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE import_staging")
+        created = sum(inserted)
+        return created, len(inserted) - created, total
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from api.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт уменьшенные варианты изображений рецептов, у которых их "
+        "ещё нет. С флагом --all пересоздаёт варианты для всех рецептов. "
+        ">>> python manage.py processimages"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать варианты для всех рецептов.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+        processed = failed = 0
+        for pk, name in recipes.values_list("pk", "image").iterator():
+            try:
+                processed += process_recipe_image(pk, name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Рецепт {pk}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано изображений: {processed}, с ошибкой: {failed}"
+            )
+        )
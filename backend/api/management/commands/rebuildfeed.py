@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.feed import backfill_feed
+from recipes.models import FeedEntry
+from users.models import Subscriptions
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает ленты подписок: удаляет все записи лент и заново "
+        "заполняет их последними рецептами авторов. "
+        ">>> python manage.py rebuildfeed"
+    )
+
+    def handle(self, *args, **options):
+        subscriptions = Subscriptions.objects.select_related("user", "author")
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            for subscription in subscriptions.iterator():
+                backfill_feed(subscription.user, subscription.author)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ленты пересобраны, записей: {FeedEntry.objects.count()}"
+            )
+        )
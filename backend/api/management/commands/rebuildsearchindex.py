@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересоздаёт полнотекстовый индекс рецептов "
+        "(tsvector + GIN в PostgreSQL, FTS5 в SQLite). "
+        ">>> python manage.py rebuildsearchindex"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="база данных, в которой пересоздаётся индекс",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        rebuild_search_index(connection)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Поисковый индекс пересоздан ({connection.vendor})"
+            )
+        )
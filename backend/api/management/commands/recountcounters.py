@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.utils import count_subquery
+from recipes.models import Carts, Favorites, Recipe
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики популярности: избранное и списки покупок "
+        "у рецептов, количество рецептов и подписчиков у пользователей. "
+        ">>> python manage.py recountcounters --batch-size 1000"
+    )
+    counters = (
+        (
+            Recipe,
+            {
+                "favorites_count": (Favorites, "recipe"),
+                "carts_count": (Carts, "recipe"),
+            },
+        ),
+        (
+            User,
+            {
+                "recipes_count": (Recipe, "author"),
+                "subscribers_count": (Subscriptions, "author"),
+            },
+        ),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="количество строк, обрабатываемых за одну транзакцию",
+        )
+
+    def handle(self, *args, **options):
+        for model, counters in self.counters:
+            checked, fixed = self.recount(
+                model, counters, options["batch_size"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{model.__name__}: проверено {checked}, "
+                    f"исправлено {fixed}"
+                )
+            )
+
+    def recount(self, model, counters, batch_size):
+        annotations = {
+            f"actual_{counter}": count_subquery(linked_model, field)
+            for counter, (linked_model, field) in counters.items()
+        }
+        checked = fixed = last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    model.objects.select_for_update()
+                    .filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .only("pk", *counters)
+                    .annotate(**annotations)[:batch_size]
+                )
+                if not batch:
+                    return checked, fixed
+
+                drifted = []
+                for obj in batch:
+                    changed = False
+                    for counter in counters:
+                        actual = getattr(obj, f"actual_{counter}")
+                        if getattr(obj, counter) != actual:
+                            setattr(obj, counter, actual)
+                            changed = True
+                    if changed:
+                        drifted.append(obj)
+                model.objects.bulk_update(drifted, counters)
+            checked += len(batch)
+            fixed += len(drifted)
+            last_pk = batch[-1].pk
@@ -1,25 +1,312 @@
+from datetime import timedelta
+from functools import wraps
+from hashlib import md5, sha256
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
 from rest_framework.response import Response
-from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
-                                   HTTP_400_BAD_REQUEST)
+from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
+                                   HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED,
+                                   HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT,
+                                   HTTP_500_INTERNAL_SERVER_ERROR)
+
+from api.catalog import catalog
+from api.constant import CATALOG_VERSION, RECIPES_VERSION, USER_VERSION
+from api.models import IdempotencyKey
+from api.utils import (bulk_insert_ignore, insert_ignore, recount_counters,
+                       update_counter, update_counters)
+from api.versions import bump_version, get_versions
+
+
+def idempotent(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        request = self.request
+        key = request.headers.get("Idempotency-Key")
+        if request.method not in ("POST",) or not key:
+            return method(self, *args, **kwargs)
+
+        user = request.user
+        key = sha256(
+            f"{user.id}:{request.get_full_path()}:{key}".encode("utf-8")
+        ).hexdigest()
+        now = timezone.now()
+        IdempotencyKey.objects.filter(
+            user=user,
+            created__lt=now - timedelta(seconds=settings.IDEMPOTENCY_TIMEOUT),
+        ).delete()
+        acquired = insert_ignore(IdempotencyKey(key=key, user=user))
+        if not acquired:
+            acquired = IdempotencyKey.objects.filter(
+                key=key,
+                status_code=None,
+                created__lt=now
+                - timedelta(seconds=settings.IDEMPOTENCY_LEASE),
+            ).update(created=now)
+        if not acquired:
+            saved = IdempotencyKey.objects.filter(key=key).first()
+            if saved is None or saved.status_code is None:
+                return Response(
+                    {"detail": "Запрос с этим ключом ещё выполняется."},
+                    status=HTTP_409_CONFLICT,
+                )
+            response = Response(saved.response, status=saved.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        saved = IdempotencyKey.objects.filter(key=key)
+        try:
+            response = method(self, *args, **kwargs)
+        except Exception:
+            saved.delete()
+            raise
+        if response.status_code < HTTP_500_INTERNAL_SERVER_ERROR:
+            saved.update(
+                status_code=response.status_code, response=response.data
+            )
+        else:
+            saved.delete()
+        return response
+
+    return wrapper
 
 
 class GetPostDeleteMixin:
-    def get_post_delete(self, pk, linked_model, serializ, q):
-        obj = get_object_or_404(self.queryset, id=pk)
-        serializer = serializ(
-            obj,
-            context={"request": self.request},
-        )
-        linked_obj = linked_model.objects.filter(q & Q(user=self.request.user))
-        linked_obj_exists = linked_obj.exists()
-        if (self.request.method in ("POST",)) and not linked_obj_exists:
-            linked_model(None, obj.id, self.request.user.id).save()
+    @idempotent
+    def get_post_delete(self, pk, linked_model, serializ, q, counter):
+        user = self.request.user
+        if self.request.method in ("POST",):
+            obj = get_object_or_404(self.queryset, id=pk)
+            try:
+                with transaction.atomic():
+                    created = insert_ignore(
+                        linked_model(None, obj.id, user.id)
+                    )
+                    if created:
+                        update_counter(obj, counter, 1)
+                        self.linked_created(obj)
+                        self.links_changed(linked_model, (obj.pk,), 1)
+                        bump_version(
+                            *self.get_linked_version_names(linked_model, user)
+                        )
+            except IntegrityError:
+                created = False
+            if not created:
+                return Response(status=HTTP_400_BAD_REQUEST)
+            serializer = serializ(obj, context={"request": self.request})
             return Response(serializer.data, status=HTTP_201_CREATED)
 
-        if (self.request.method in ("DELETE",)) and linked_obj_exists:
-            linked_obj[0].delete()
-            return Response(status=HTTP_204_NO_CONTENT)
+        if self.request.method in ("DELETE",):
+            with transaction.atomic():
+                deleted, _ = linked_model.objects.filter(
+                    q & Q(user=user)
+                ).delete()
+                if deleted:
+                    update_counters(self.queryset.model, (pk,), counter, -1)
+                    self.linked_deleted(pk)
+                    self.links_changed(linked_model, (pk,), -1)
+                    bump_version(
+                        *self.get_linked_version_names(linked_model, user)
+                    )
+            if deleted:
+                return Response(status=HTTP_204_NO_CONTENT)
+            get_object_or_404(self.queryset, id=pk)
 
         return Response(status=HTTP_400_BAD_REQUEST)
+
+    @idempotent
+    def bulk_post_delete(self, linked_model, field, serializ, counter):
+        serializer = serializ(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        pks = list(dict.fromkeys(serializer.validated_data["ids"]))
+        user = self.request.user
+
+        with transaction.atomic():
+            found = set(
+                self.queryset.filter(pk__in=pks).values_list("pk", flat=True)
+            )
+            links = linked_model.objects.filter(
+                user=user, **{f"{field}__in": found}
+            )
+            if self.request.method in ("POST",):
+                linked = set(links.values_list(f"{field}_id", flat=True))
+                changed = bulk_insert_ignore(
+                    [
+                        linked_model(user=user, **{f"{field}_id": pk})
+                        for pk in sorted(found - linked)
+                    ],
+                    field,
+                    links,
+                    linked,
+                )
+                delta, done, skipped = 1, "created", "exists"
+            else:
+                linked = dict(
+                    links.select_for_update().values_list(
+                        "pk", f"{field}_id"
+                    )
+                )
+                linked_model.objects.filter(pk__in=linked).delete()
+                changed = set(linked.values())
+                delta, done, skipped = -1, "deleted", "absent"
+            if changed:
+                update_counters(
+                    self.queryset.model, changed, counter, delta
+                )
+                self.links_changed(linked_model, changed, delta)
+                bump_version(
+                    *self.get_linked_version_names(linked_model, user)
+                )
+
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": pk,
+                        "status": (
+                            "not_found"
+                            if pk not in found
+                            else done if pk in changed else skipped
+                        ),
+                    }
+                    for pk in pks
+                ]
+            }
+        )
+
+    def get_linked_version_names(self, linked_model, user):
+        return (USER_VERSION.format(user.id),)
+
+    def linked_created(self, obj):
+        pass
+
+    def linked_deleted(self, pk):
+        pass
+
+    def links_changed(self, linked_model, pks, delta):
+        pass
+
+
+class VersionAdminMixin:
+    def get_version_names(self, objs):
+        return (RECIPES_VERSION,)
+
+    def versions_changed(self, objs):
+        bump_version(*self.get_version_names(objs))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.versions_changed([form.instance])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.versions_changed([obj])
+
+    def delete_queryset(self, request, queryset):
+        objs = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.versions_changed(objs)
+
+
+class UserVersionAdminMixin(VersionAdminMixin):
+    def get_version_names(self, objs):
+        return {USER_VERSION.format(obj.user_id) for obj in objs}
+
+
+class CounterAdminMixin:
+    counters = {}
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.counters_changed([obj], form.initial if change else None)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.counters_changed([obj])
+
+    def delete_queryset(self, request, queryset):
+        objs = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.counters_changed(objs)
+
+    def counters_changed(self, objs, initial=None):
+        initial = initial or {}
+        for field, counter in self.counters.items():
+            pks = {getattr(obj, f"{field}_id") for obj in objs}
+            if initial.get(field) is not None:
+                pks.add(initial[field])
+            recount_counters(
+                self.model._meta.get_field(field).related_model,
+                pks,
+                {counter: (self.model, field)},
+            )
+
+
+class ConditionalGetMixin:
+    version_names = (CATALOG_VERSION,)
+
+    def get_version_names(self):
+        return self.version_names
+
+    def load_versions(self):
+        names = set(self.get_version_names())
+        versions = get_versions(*(names - {CATALOG_VERSION}))
+        if CATALOG_VERSION in names:
+            versions[CATALOG_VERSION] = catalog.get_version()
+        return versions
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if hasattr(self, "versions"):
+            context["versions"] = self.versions
+        return context
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        self.versions = self.load_versions()
+        validator = "|".join(
+            (
+                request.get_full_path(),
+                request.accepted_media_type,
+                *(
+                    f"{name}={value}"
+                    for name, (value, _) in sorted(self.versions.items())
+                ),
+            )
+        )
+        etag = quote_etag(md5(validator.encode("utf-8")).hexdigest())
+        last_modified = max(
+            (modified for _, modified in self.versions.values() if modified),
+            default=None,
+        )
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+            if last_modified >= int(timezone.now().timestamp()):
+                last_modified = None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (HTTP_200_OK, HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Accept", "Authorization"))
+        return response
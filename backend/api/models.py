@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
+                              Index, JSONField, Model, PositiveBigIntegerField,
+                              PositiveSmallIntegerField)
+
+
+class Version(Model):
+    name = CharField(
+        verbose_name="Название",
+        max_length=64,
+        unique=True,
+    )
+    value = PositiveBigIntegerField(
+        verbose_name="Версия",
+        default=0,
+    )
+    modified = DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class IdempotencyKey(Model):
+    key = CharField(
+        verbose_name="Ключ",
+        max_length=64,
+        unique=True,
+    )
+    user = ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        verbose_name="Пользователь",
+        related_name="idempotency_keys",
+        on_delete=CASCADE,
+    )
+    status_code = PositiveSmallIntegerField(
+        verbose_name="Код ответа",
+        null=True,
+    )
+    response = JSONField(
+        verbose_name="Ответ",
+        null=True,
+        encoder=DjangoJSONEncoder,
+    )
+    created = DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        indexes = (
+            Index(
+                fields=("user", "created"),
+                name="idempotency_user_created_idx",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.status_code}"
+
+
+class ShoppingListExport(Model):
+    user = ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        verbose_name="Пользователь",
+        related_name="shopping_list_exports",
+        on_delete=CASCADE,
+    )
+    name = CharField(
+        verbose_name="Имя файла",
+        max_length=128,
+        unique=True,
+    )
+    status = CharField(
+        verbose_name="Статус",
+        max_length=16,
+    )
+    modified = DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Выгрузка списка покупок"
+        verbose_name_plural = "Выгрузки списков покупок"
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.status}"
@@ -1,6 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+
+class KeysetPagination(BasePagination):
+    page_size = 6
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    ordering = ("-pub_date", "-id")
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = getattr(view, "cursor_ordering", self.ordering)
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(
+            self.get_model(queryset), request
+        )
+
+        results = self.get_page(queryset, values, reverse)
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_values = self.previous_values = None
+        if results and (has_more or reverse):
+            self.next_values = self.get_values(results[-1])
+        if results and (has_more if reverse else values is not None):
+            self.previous_values = self.get_values(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_link(self.next_values, reverse=False),
+                "previous": self.get_link(self.previous_values, reverse=True),
+                "results": data,
+            }
+        )
+
+    def get_model(self, queryset):
+        return queryset.model
+
+    def get_page(self, queryset, values, reverse):
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        if values is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(values, reverse)
+            )
+        return list(queryset[: self.page_size + 1])
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+
+    def get_position_filter(self, values, reverse):
+        position = Q()
+        for index, field in enumerate(self.get_ordering(reverse)):
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition = Q(**{f"{field.lstrip('-')}__{lookup}": values[index]})
+            for previous, value in zip(self.ordering, values[:index]):
+                condition &= Q(**{previous.lstrip("-"): value})
+            position |= condition
+        return position
+
+    def get_values(self, obj):
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def get_link(self, values, reverse):
+        if values is None:
+            return None
+        cursor = {"v": [str(value) for value in values], "r": reverse}
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor).encode("utf-8")
+        ).decode("ascii")
+        return replace_query_param(
+            remove_query_param(self.base_url, "page"),
+            self.cursor_query_param,
+            encoded,
+        )
+
+    def decode_cursor(self, model, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            values = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, cursor["v"])
+            ]
+            reverse = bool(cursor["r"])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+
+class FeedPagination(KeysetPagination):
+    ordering = ("-pub_date", "-recipe_id")
+
+    def get_model(self, sources):
+        return sources[0].model
+
+    def get_page(self, sources, values, reverse):
+        ordering = self.get_ordering(reverse)
+        position = Q()
+        if values is not None:
+            position = self.get_position_filter(values, reverse)
+        rows = set()
+        for queryset in sources:
+            rows.update(
+                queryset.filter(position)
+                .order_by(*ordering)
+                .values_list("pub_date", "recipe_id")[: self.page_size + 1]
+            )
+        return sorted(rows, reverse=not reverse)[: self.page_size + 1]
+
+    def get_values(self, row):
+        return list(row)
+
+
+class PageLimitOrCursorPagination(PageLimitPagination):
+    cursor_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is None:
+            return super().get_paginated_response(data)
+        return self.cursor_paginator.get_paginated_response(data)
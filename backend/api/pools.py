@@ -0,0 +1,25 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import django
+
+process_pools = {}
+
+
+def get_process_pool(name, max_workers):
+    if name not in process_pools:
+        process_pools[name] = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_context("spawn"),
+            initializer=django.setup,
+        )
+    return process_pools[name]
+
+
+def submit_to_pool(name, max_workers, function, *args):
+    try:
+        return get_process_pool(name, max_workers).submit(function, *args)
+    except BrokenProcessPool:
+        process_pools.pop(name).shutdown(wait=False)
+        return get_process_pool(name, max_workers).submit(function, *args)
@@ -1,33 +1,129 @@
+from pathlib import PurePosixPath
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
-from django.db.models import F
-from drf_extra_fields.fields import Base64ImageField
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.db.models import Manager
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from rest_framework.exceptions import ValidationError
 from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.serializers import (
     IntegerField,
+    ListField,
+    ListSerializer,
     ModelSerializer,
+    ReadOnlyField,
+    Serializer,
     SerializerMethodField,
 )
 
-from api.utils import amount_ingredient_create
+from api.catalog import catalog
+from api.constant import (
+    BULK_LIMIT_MAX,
+    CATALOG_VERSION,
+    RECIPES_VERSION,
+)
+from api.feed import fan_out_recipe
+from api.fieldsets import Fieldset
+from api.images import (
+    IMAGE_FORMATS,
+    schedule_image_processing,
+    strip_metadata,
+)
+from api.utils import (
+    prefetch_latest_recipes,
+    prefetch_recipe_relations,
+    sync_recipe_ingredients,
+    sync_recipe_tags,
+    touch_author_recipes,
+    update_counter,
+)
+from api.versions import bump_version
 from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from recipes.storage import content_storage
 
 User = get_user_model()
 
 
+class RecipeImageField(Base64ImageField):
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            extension = PurePosixPath(data.name).suffix.lower()
+            data.name = f"{self.get_file_name(None)}{extension}"
+            image = super(Base64FieldMixin, self).to_internal_value(data)
+        else:
+            image = super().to_internal_value(data)
+        if image is None:
+            return None
+        return strip_metadata(image)
+
+
+class ImageVariantsField(ReadOnlyField):
+    def to_representation(self, variants):
+        request = self.context.get("request")
+        data = {}
+        for name, variant in variants.items():
+            data[name] = variant.copy()
+            for extension, _ in IMAGE_FORMATS:
+                url = content_storage.url(variant[extension])
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                data[name][extension] = url
+        return data
+
+
 class FavoriteCartRecipeSerializer(ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_variants",
+            "image_placeholder",
             "cooking_time",
         )
         read_only_fields = ("__all__",)
 
 
-class UserSerializer(ModelSerializer):
+class FieldsetMixin:
+    def get_fieldset(self):
+        if not hasattr(self, "fieldset"):
+            parent = self.parent
+            if isinstance(parent, ListSerializer):
+                parent = parent.parent
+            if parent is None:
+                self.fieldset = Fieldset.from_request(
+                    self.context.get("request")
+                )
+            else:
+                self.fieldset = Fieldset()
+        return self.fieldset
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        for name in list(fields):
+            if not fieldset.includes(name):
+                del fields[name]
+            elif isinstance(fields[name], FieldsetMixin):
+                fields[name].fieldset = fieldset.nested(name)
+        return fields
+
+
+class IdsSerializer(Serializer):
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_LIMIT_MAX,
+    )
+
+
+class UserSerializer(FieldsetMixin, ModelSerializer):
     is_subscribed = SerializerMethodField()
 
     class Meta:
@@ -49,6 +145,9 @@ class UserSerializer(ModelSerializer):
         if user.is_anonymous or (user == author):
             return False
 
+        if hasattr(author, "is_subscribed"):
+            return author.is_subscribed
+
         return user.subscriptions.filter(author=author).exists()
 
     def create(self, validated_data):
@@ -62,6 +161,18 @@ class UserSerializer(ModelSerializer):
         user.save()
         return user
 
+    def update(self, user, validated_data):
+        user = super().update(user, validated_data)
+        touch_author_recipes([user])
+        return user
+
+
+class UserSubscribeListSerializer(ListSerializer):
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        self.child.prefetch_recipes(authors)
+        return super().to_representation(authors)
+
 
 class UserSubscribeSerializer(UserSerializer):
     recipes = SerializerMethodField()
@@ -80,18 +191,31 @@ class UserSubscribeSerializer(UserSerializer):
             "recipes_count",
         )
         read_only_fields = ("__all__",)
+        list_serializer_class = UserSubscribeListSerializer
+
+    def to_representation(self, author):
+        if not hasattr(author, "latest_recipes"):
+            self.prefetch_recipes([author])
+        return super().to_representation(author)
+
+    def prefetch_recipes(self, authors):
+        if "recipes" in self.fields:
+            prefetch_latest_recipes(authors, self.get_recipes_limit())
+
+    def get_recipes_limit(self):
+        request = self.context.get("request")
+        try:
+            recipes_limit = int(request.query_params["recipes_limit"])
+        except (KeyError, ValueError):
+            return None
+        return max(recipes_limit, 0)
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        recipes_limit = request.GET.get("recipes_limit")
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[: int(recipes_limit)]
         serializer = FavoriteCartRecipeSerializer(
-            recipes, many=True, read_only=True
+            obj.latest_recipes, many=True, read_only=True
         )
         return serializer.data
 
@@ -119,13 +243,33 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = ("__all__",)
 
 
-class RecipeGetSerializer(ModelSerializer):
-    tags = TagSerializer(many=True, read_only=True)
+class CatalogTagField(PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            tag = catalog.get_tag_object(int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if tag is None:
+            self.fail("does_not_exist", pk_value=data)
+        return tag
+
+
+class RecipeListSerializer(ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(recipes))
+
+
+class RecipeGetSerializer(FieldsetMixin, ModelSerializer):
+    tags = SerializerMethodField()
     author = UserSerializer(read_only=True)
     ingredients = SerializerMethodField()
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -138,6 +282,8 @@ class RecipeGetSerializer(ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
+            "image_placeholder",
             "text",
             "cooking_time",
         )
@@ -145,18 +291,93 @@ class RecipeGetSerializer(ModelSerializer):
             "is_favorite",
             "is_shopping_cart",
         )
+        list_serializer_class = RecipeListSerializer
 
-    def get_ingredients(self, recipe):
-        return recipe.ingredients.values(
-            "id", "name", "measurement_unit", amount=F("recipe__amount")
+    def to_representation(self, recipe):
+        return self.to_representation_many([recipe])[0]
+
+    def to_representation_many(self, recipes):
+        if "author" in self.fields:
+            for recipe in recipes:
+                if recipe.author is not None and hasattr(
+                    recipe, "is_author_subscribed"
+                ):
+                    recipe.author.is_subscribed = recipe.is_author_subscribed
+
+        keys = [self.get_cache_key(recipe) for recipe in recipes]
+        fragments = cache.get_many(keys)
+        missing = [
+            (key, recipe)
+            for key, recipe in zip(keys, recipes)
+            if key not in fragments
+        ]
+        if missing:
+            prefetch_recipe_relations(
+                [recipe for _, recipe in missing],
+                tags="tags" in self.fields,
+                ingredients="ingredients" in self.fields,
+            )
+            rendered = {
+                key: self.get_fragment(recipe) for key, recipe in missing
+            }
+            cache.set_many(rendered, settings.RECIPE_CACHE_TIMEOUT)
+            fragments.update(rendered)
+
+        return [
+            self.add_user_fields(fragments[key], recipe)
+            for key, recipe in zip(keys, recipes)
+        ]
+
+    def get_cache_key(self, recipe):
+        request = self.context["request"]
+        if "versions" not in self.context:
+            self.context["versions"] = {
+                CATALOG_VERSION: catalog.get_version()
+            }
+        catalog_version, _ = self.context["versions"][CATALOG_VERSION]
+        return (
+            f"recipe:{recipe.pk}:{recipe.modified.timestamp()}:"
+            f"{catalog_version}:{request.scheme}://{request.get_host()}:"
+            f"{self.get_fieldset().key}"
         )
 
+    def get_fragment(self, recipe):
+        fragment = super().to_representation(recipe)
+        for name in ("is_favorited", "is_in_shopping_cart"):
+            if name in fragment:
+                fragment[name] = None
+        if fragment.get("author") and "is_subscribed" in fragment["author"]:
+            fragment["author"]["is_subscribed"] = None
+        return fragment
+
+    def add_user_fields(self, fragment, recipe):
+        data = fragment.copy()
+        if "is_favorited" in data:
+            data["is_favorited"] = self.get_is_favorited(recipe)
+        if "is_in_shopping_cart" in data:
+            data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(recipe)
+        if data.get("author") and "is_subscribed" in data["author"]:
+            data["author"] = data["author"].copy()
+            data["author"]["is_subscribed"] = self.fields[
+                "author"
+            ].get_is_subscribed(recipe.author)
+        return data
+
+    def get_tags(self, recipe):
+        return catalog.sort_tags(recipe.tag_ids)
+
+    def get_ingredients(self, recipe):
+        return catalog.sort_ingredients(recipe.amounts)
+
     def get_is_favorited(self, recipe):
         user = self.context["request"].user
 
         if user.is_anonymous:
             return False
 
+        if hasattr(recipe, "is_favorited"):
+            return recipe.is_favorited
+
         return user.favorites.filter(recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
@@ -165,6 +386,9 @@ class RecipeGetSerializer(ModelSerializer):
         if user.is_anonymous:
             return False
 
+        if hasattr(recipe, "is_in_shopping_cart"):
+            return recipe.is_in_shopping_cart
+
         return user.carts.filter(recipe=recipe).exists()
 
 
@@ -178,8 +402,8 @@ class AmountIngredientSerializer(ModelSerializer):
 
 class RecipeSerializer(ModelSerializer):
     ingredients = AmountIngredientSerializer(many=True)
-    tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
-    image = Base64ImageField()
+    tags = CatalogTagField(queryset=Tag.objects.all(), many=True)
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -219,9 +443,9 @@ class RecipeSerializer(ModelSerializer):
             else:
                 raise ValidationError("Ингредиент не должен повторяться")
 
-        db_ingredients = Ingredient.objects.filter(pk__in=ingredients_id)
-        if not db_ingredients:
-            raise ValidationError("Такого ингредиента не существует")
+        for ingredient_id in ingredients_id:
+            if catalog.get_ingredient(ingredient_id) is None:
+                raise ValidationError("Такого ингредиента не существует")
 
         return data
 
@@ -229,27 +453,56 @@ class RecipeSerializer(ModelSerializer):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
 
-        recipe = Recipe.objects.create(
-            author=self.context["request"].user, **validated_data
-        )
-        recipe.tags.set(tags)
-        amount_ingredient_create(recipe, ingredients)
+        try:
+            with transaction.atomic():
+                recipe = Recipe.objects.create(
+                    author=self.context["request"].user, **validated_data
+                )
+                sync_recipe_tags(recipe, tags, created=True)
+                sync_recipe_ingredients(recipe, ingredients, created=True)
+                update_counter(recipe.author, "recipes_count", 1)
+                fan_out_recipe(recipe)
+                schedule_image_processing(recipe)
+                bump_version(RECIPES_VERSION)
+        except IntegrityError:
+            self.check_references(tags, ingredients)
+            raise
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
     def update(self, recipe, validated_data):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
 
-        super().update(recipe, validated_data)
-
-        if tags:
-            recipe.tags.clear()
-            recipe.tags.set(tags)
-
-        if ingredients:
-            recipe.ingredients.clear()
-            amount_ingredient_create(recipe, ingredients)
+        if "image" in validated_data:
+            validated_data.update(image_variants={}, image_placeholder="")
+
+        try:
+            with transaction.atomic():
+                super().update(recipe, validated_data)
+                if "image" in validated_data:
+                    schedule_image_processing(recipe)
+                if tags:
+                    sync_recipe_tags(recipe, tags)
+                if ingredients:
+                    sync_recipe_ingredients(recipe, ingredients)
+                bump_version(RECIPES_VERSION)
+        except IntegrityError:
+            self.check_references(tags, ingredients)
+            raise
         return recipe
 
+    def check_references(self, tags, ingredients):
+        tag_ids = {tag.pk for tag in tags}
+        if Tag.objects.filter(pk__in=tag_ids).count() < len(tag_ids):
+            raise ValidationError({"tags": "Такого тега не существует"})
+        ingredient_ids = {ingredient["id"] for ingredient in ingredients}
+        if Ingredient.objects.filter(pk__in=ingredient_ids).count() < len(
+            ingredient_ids
+        ):
+            raise ValidationError(
+                {"ingredients": "Такого ингредиента не существует"}
+            )
+
     def to_representation(self, recipe):
         return RecipeGetSerializer(recipe, context=self.context).data
@@ -0,0 +1,283 @@
+import csv
+import logging
+import os
+from datetime import timedelta
+from functools import partial
+from glob import glob
+from hashlib import md5
+from tempfile import NamedTemporaryFile
+from urllib.parse import quote
+
+import orjson
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.catalog import catalog
+from api.constant import CART_VERSION
+from api.models import ShoppingListExport
+from api.pools import submit_to_pool
+from api.units import normalize_amounts
+from api.utils import insert_ignore
+from api.versions import get_versions
+from recipes.models import CartIngredient
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+FONT = "Montserrat-SemiBold"
+FONT_PATH = os.path.join(settings.BASE_DIR, "Montserrat-SemiBold.ttf")
+
+EXPORT_SALT = "shopping-list-export"
+EXPORT_PENDING = "pending"
+EXPORT_READY = "ready"
+EXPORT_FAILED = "failed"
+
+
+def register_fonts():
+    pdfmetrics.registerFont(TTFont(FONT, FONT_PATH, "UTF-8"))
+
+
+def get_shopping_list_ingredients(user):
+    return normalize_amounts(
+        CartIngredient.objects.filter(user=user)
+        .order_by("ingredient__name", "ingredient__measurement_unit")
+        .values(
+            "amount",
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+        )
+        .iterator()
+    )
+
+
+def render_shopping_list(user, file):
+    ingredients = get_shopping_list_ingredients(user)
+
+    cart_version = CART_VERSION.format(user.id)
+    _, modified = get_versions(cart_version)[cart_version]
+
+    pdf_file = canvas.Canvas(file)
+    pdf_file.setFont(FONT, 16)
+    if modified is not None:
+        modified = timezone.localtime(modified)
+        pdf_file.drawString(
+            50,
+            800,
+            f"{modified.strftime('%d/%m/%Y %H:%M')}",
+        )
+
+    pdf_file.drawString(50, 750, f"Список покупок для: {user.first_name}")
+    pdf_file.setFont(FONT, 14)
+    from_bottom = 700
+    for ingredient in ingredients:
+        pdf_file.drawString(
+            50,
+            from_bottom,
+            (
+                f"{ingredient['name']}: "
+                f"{ingredient['amount']} {ingredient['measurement_unit']}"
+            ),
+        )
+        from_bottom -= 20
+        if from_bottom <= 50:
+            from_bottom = 700
+            pdf_file.showPage()
+            pdf_file.setFont(FONT, 14)
+    pdf_file.showPage()
+    pdf_file.save()
+
+
+def get_shopping_list_name(user):
+    cart_version = CART_VERSION.format(user.id)
+    version, _ = get_versions(cart_version)[cart_version]
+    name = md5(user.first_name.encode("utf-8")).hexdigest()[:8]
+    return f"{user.id}-{version}-{catalog.get_version()[0]}-{name}.pdf"
+
+
+def get_shopping_list_path(name):
+    return os.path.join(settings.SHOPPING_LIST_ROOT, name)
+
+
+def open_descriptor(path):
+    return os.fdopen(os.open(path, os.O_RDONLY), "rb")
+
+
+def build_shopping_list(user, name):
+    root = settings.SHOPPING_LIST_ROOT
+    path = get_shopping_list_path(name)
+    os.makedirs(root, exist_ok=True)
+    with NamedTemporaryFile(dir=root, suffix=".tmp", delete=False) as file:
+        render_shopping_list(user, file)
+    shopping_list = open_descriptor(file.name)
+    os.replace(file.name, path)
+    for stale in glob(os.path.join(root, f"{user.id}-*.pdf")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    return shopping_list
+
+
+def open_shopping_list(name):
+    try:
+        return open_descriptor(get_shopping_list_path(name))
+    except FileNotFoundError:
+        return None
+
+
+def export_shopping_list(user_id, name):
+    try:
+        build_shopping_list(User.objects.get(pk=user_id), name).close()
+    except Exception:
+        logger.exception("Не удалось собрать список покупок %s", name)
+        export_status = EXPORT_FAILED
+    else:
+        export_status = EXPORT_READY
+    ShoppingListExport.objects.filter(name=name).update(
+        status=export_status, modified=timezone.now()
+    )
+
+
+def run_export(user_id, name):
+    try:
+        export_shopping_list(user_id, name)
+    finally:
+        connections.close_all()
+
+
+def get_stale_export_time():
+    return timezone.now() - timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_TIMEOUT
+    )
+
+
+def start_export(user, name, filename):
+    with transaction.atomic():
+        if insert_ignore(
+            ShoppingListExport(user=user, name=name, status=EXPORT_PENDING)
+        ):
+            ShoppingListExport.objects.filter(user=user).exclude(
+                name=name
+            ).delete()
+            started = True
+        else:
+            started = ShoppingListExport.objects.filter(name=name).exclude(
+                status=EXPORT_PENDING, modified__gt=get_stale_export_time()
+            ).update(status=EXPORT_PENDING, modified=timezone.now())
+        if started:
+            transaction.on_commit(
+                partial(
+                    submit_to_pool,
+                    "shopping-lists",
+                    settings.SHOPPING_LIST_WORKERS,
+                    run_export,
+                    user.pk,
+                    name,
+                )
+            )
+    return signing.dumps((user.pk, name, filename), salt=EXPORT_SALT)
+
+
+def load_export(token):
+    try:
+        user_id, name, filename = signing.loads(
+            token,
+            salt=EXPORT_SALT,
+            max_age=settings.SHOPPING_LIST_EXPORT_TIMEOUT,
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        return None, None, None
+    export_status, modified = ShoppingListExport.objects.filter(
+        name=name
+    ).values_list("status", "modified").first() or (None, None)
+    if export_status == EXPORT_READY and os.path.exists(
+        get_shopping_list_path(name)
+    ):
+        return name, filename, export_status
+    if export_status == EXPORT_FAILED or (
+        export_status == EXPORT_PENDING and modified > get_stale_export_time()
+    ):
+        return name, filename, export_status
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or get_shopping_list_name(user) != name:
+        return None, None, None
+    start_export(user, name, filename)
+    return name, filename, EXPORT_PENDING
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f"{ingredient['name']}: "
+            f"{ingredient['amount']} {ingredient['measurement_unit']}\n"
+        )
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "amount", "measurement_unit"))
+    for ingredient in ingredients:
+        yield writer.writerow(
+            (
+                ingredient["name"],
+                ingredient["amount"],
+                ingredient["measurement_unit"],
+            )
+        )
+
+
+def stream_json(ingredients):
+    yield "["
+    separator = ""
+    for ingredient in ingredients:
+        row = {
+            "name": ingredient["name"],
+            "amount": ingredient["amount"],
+            "measurement_unit": ingredient["measurement_unit"],
+        }
+        yield separator + orjson.dumps(row).decode()
+        separator = ","
+    yield "]"
+
+
+SHOPPING_LIST_FORMATS = {
+    "txt": (stream_txt, "text/plain; charset=utf-8"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "json": (stream_json, "application/json"),
+}
+
+
+def stream_shopping_list(user, shopping_format):
+    stream, _ = SHOPPING_LIST_FORMATS[shopping_format]
+    chunk, size = [], 0
+    for line in stream(get_shopping_list_ingredients(user)):
+        chunk.append(line)
+        size += len(line)
+        if size >= settings.SHOPPING_LIST_STREAM_CHUNK:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    yield "".join(chunk)
+
+
+def content_disposition(filename):
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+    filename = filename.replace("\\", "\\\\").replace('"', r"\"")
+    return f'attachment; filename="{filename}"'
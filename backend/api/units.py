@@ -0,0 +1,43 @@
+from itertools import groupby
+from operator import itemgetter
+
+UNIT_FAMILIES = (
+    (("г", 1), ("кг", 1000)),
+    (("мл", 1), ("л", 1000)),
+    (("ч. л.", 1), ("ст. л.", 3)),
+)
+
+
+def normalize_unit(unit):
+    return unit.casefold().replace(" ", "").rstrip(".")
+
+
+UNITS = {
+    normalize_unit(unit): (family[0][0], factor)
+    for family in UNIT_FAMILIES
+    for unit, factor in family
+}
+DISPLAY_UNITS = {
+    family[0][0]: sorted(family, key=itemgetter(1), reverse=True)
+    for family in UNIT_FAMILIES
+}
+
+
+def convert_amount(amount, base):
+    for unit, factor in DISPLAY_UNITS.get(base, ((base, 1),)):
+        if amount >= factor and amount * 100 % factor == 0:
+            value = amount / factor
+            return unit, int(value) if value.is_integer() else value
+    return base, amount
+
+
+def normalize_amounts(ingredients):
+    for name, rows in groupby(ingredients, key=itemgetter("name")):
+        totals = {}
+        for row in rows:
+            unit = row["measurement_unit"]
+            base, factor = UNITS.get(normalize_unit(unit), (unit, 1))
+            totals[base] = totals.get(base, 0) + row["amount"] * factor
+        for base, amount in totals.items():
+            unit, amount = convert_amount(amount, base)
+            yield {"name": name, "measurement_unit": unit, "amount": amount}
@@ -0,0 +1,6 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class ChunkedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = settings.FILE_UPLOAD_CHUNK_SIZE
@@ -1,16 +1,298 @@
-from recipes.models import AmountIngredient, Ingredient
+from django.db import connections, router
+from django.db.models import (AutoField, BooleanField, Count, Exists, F,
+                              IntegerField, OuterRef, Subquery, Value, Window)
+from django.db.models.functions import Coalesce, RowNumber
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
 
+from api.carts import recipe_amounts_changed
+from api.constant import RECIPES_VERSION
+from api.feed import update_feed_modes
+from api.fieldsets import Fieldset
+from api.versions import bump_version
+from recipes.models import AmountIngredient, Carts, Favorites, Recipe
+from users.models import Subscriptions
 
-def amount_ingredient_create(recipe, ingredients):
-    amount_ingredient = []
+USER_LINKED_COUNTERS = (
+    (Favorites, "recipe", "favorites_count"),
+    (Carts, "recipe", "carts_count"),
+    (Subscriptions, "author", "subscribers_count"),
+)
 
-    for ingredient in ingredients:
-        amount_ingredient.append(
-            AmountIngredient(
-                recipe=recipe,
-                ingredients=Ingredient.objects.get(pk=ingredient["id"]),
-                amount=ingredient["amount"],
+
+def sync_recipe_tags(recipe, tags, created=False):
+    tag_ids = {tag.pk for tag in tags}
+    current = set()
+    if not created:
+        current = set(
+            Recipe.tags.through.objects.filter(recipe=recipe).values_list(
+                "tag_id", flat=True
             )
         )
+    if current - tag_ids:
+        Recipe.tags.through.objects.filter(
+            recipe=recipe, tag_id__in=current - tag_ids
+        ).delete()
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+        for tag_id in tag_ids - current
+    )
+    recipe.tag_ids = list(tag_ids)
+
+
+def sync_recipe_ingredients(recipe, ingredients, created=False):
+    amounts = {
+        ingredient["id"]: int(ingredient["amount"])
+        for ingredient in ingredients
+    }
+    current = {}
+    if not created:
+        current = {
+            row.ingredients_id: row
+            for row in AmountIngredient.objects.filter(recipe=recipe)
+        }
+    old = {pk: row.amount for pk, row in current.items()}
+
+    deleted = [
+        row.pk for pk, row in current.items() if pk not in amounts
+    ]
+    if deleted:
+        AmountIngredient.objects.filter(pk__in=deleted).delete()
+    changed = []
+    for pk, row in current.items():
+        if pk in amounts and row.amount != amounts[pk]:
+            row.amount = amounts[pk]
+            changed.append(row)
+    AmountIngredient.objects.bulk_update(changed, ("amount",))
+    AmountIngredient.objects.bulk_create(
+        AmountIngredient(recipe=recipe, ingredients_id=pk, amount=amount)
+        for pk, amount in amounts.items()
+        if pk not in current
+    )
+    if not created:
+        recipe_amounts_changed(recipe, old, amounts)
+    recipe.amounts = list(amounts.items())
+
+
+def touch_recipes(recipes):
+    Recipe.objects.filter(pk__in=recipes).update(modified=timezone.now())
+    bump_version(RECIPES_VERSION)
+
+
+def touch_author_recipes(authors):
+    Recipe.objects.filter(author__in=authors).update(modified=timezone.now())
+    bump_version(RECIPES_VERSION)
+
+
+def get_insert_ignore_sql(model, objs):
+    using = router.db_for_write(model)
+    query = InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(
+        [
+            field
+            for field in model._meta.concrete_fields
+            if not isinstance(field, AutoField)
+        ],
+        objs,
+    )
+    sql, params = query.get_compiler(using=using).as_sql()[0]
+    return connections[using], sql, params
+
+
+def insert_ignore(obj):
+    connection, sql, params = get_insert_ignore_sql(type(obj), [obj])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def can_return_inserted(connection):
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.features.can_return_rows_from_bulk_insert
+
+
+def bulk_insert_ignore(objs, field, queryset, existing):
+    if not objs:
+        return set()
+    model = type(objs[0])
+    connection, sql, params = get_insert_ignore_sql(model, objs)
+    if can_return_inserted(connection):
+        column = connection.ops.quote_name(model._meta.get_field(field).column)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{sql} RETURNING {column}", params)
+            return {value for value, in cursor.fetchall()}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+    return (
+        set(queryset.values_list(f"{field}_id", flat=True)) - existing
+    )
+
+
+def update_counter(obj, counter, delta):
+    update_counters(type(obj), (obj.pk,), counter, delta)
+
+
+def update_counters(model, pks, counter, delta):
+    model.objects.filter(pk__in=pks).update(**{counter: F(counter) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount_counters(model, pks, counters):
+    model.objects.filter(pk__in=pks).update(
+        **{
+            counter: count_subquery(linked_model, field)
+            for counter, (linked_model, field) in counters.items()
+        }
+    )
+
 
-    AmountIngredient.objects.bulk_create(amount_ingredient)
+def get_user_links(users):
+    touch_author_recipes(users)
+    authors = set(
+        Subscriptions.objects.filter(user__in=users).values_list(
+            "author", flat=True
+        )
+    )
+    return authors, [
+        (
+            linked_model,
+            field,
+            counter,
+            set(
+                linked_model.objects.filter(user__in=users).values_list(
+                    field, flat=True
+                )
+            ),
+        )
+        for linked_model, field, counter in USER_LINKED_COUNTERS
+    ]
+
+
+def user_links_deleted(links):
+    authors, counters = links
+    for linked_model, field, counter, pks in counters:
+        recount_counters(
+            linked_model._meta.get_field(field).related_model,
+            pks,
+            {counter: (linked_model, field)},
+        )
+    update_feed_modes(authors)
+
+
+def annotate_is_subscribed(queryset, user):
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Subscriptions.objects.filter(user=user, author=OuterRef("pk"))
+        )
+    )
+
+
+def annotate_recipes(queryset, user, fieldset=None):
+    fieldset = fieldset or Fieldset()
+    if not fieldset.includes("text"):
+        queryset = queryset.defer("text")
+    if fieldset.includes("author"):
+        queryset = queryset.select_related("author")
+
+    linked = {}
+    if fieldset.includes("is_favorited"):
+        linked["is_favorited"] = (Favorites, "recipe", "pk")
+    if fieldset.includes("is_in_shopping_cart"):
+        linked["is_in_shopping_cart"] = (Carts, "recipe", "pk")
+    if fieldset.includes_nested("author", "is_subscribed"):
+        linked["is_author_subscribed"] = (Subscriptions, "author", "author")
+
+    if user.is_anonymous:
+        return queryset.annotate(
+            **{
+                name: Value(False, output_field=BooleanField())
+                for name in linked
+            }
+        )
+
+    return queryset.annotate(
+        **{
+            name: Exists(
+                model.objects.filter(user=user, **{field: OuterRef(outer)})
+            )
+            for name, (model, field, outer) in linked.items()
+        }
+    )
+
+
+def prefetch_recipe_relations(recipes, tags=True, ingredients=True):
+    if tags:
+        missing = [obj for obj in recipes if not hasattr(obj, "tag_ids")]
+        tag_ids = {recipe.pk: [] for recipe in missing}
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe__in=missing
+        ).values_list("recipe_id", "tag_id"):
+            tag_ids[recipe_id].append(tag_id)
+        for recipe in missing:
+            recipe.tag_ids = tag_ids[recipe.pk]
+    if ingredients:
+        missing = [obj for obj in recipes if not hasattr(obj, "amounts")]
+        amounts = {recipe.pk: [] for recipe in missing}
+        for recipe_id, *amount in AmountIngredient.objects.filter(
+            recipe__in=missing
+        ).values_list("recipe_id", "ingredients_id", "amount"):
+            amounts[recipe_id].append(tuple(amount))
+        for recipe in missing:
+            recipe.amounts = amounts[recipe.pk]
+
+
+def prefetch_latest_recipes(authors, limit):
+    latest = {author.pk: [] for author in authors}
+    if authors and limit != 0:
+        ranked = (
+            Recipe.objects.filter(author__in=authors)
+            .annotate(
+                recipe_rank=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=(F("pub_date").desc(), F("id").desc()),
+                )
+            )
+            .order_by()
+            .only(
+                "id",
+                "name",
+                "image",
+                "image_variants",
+                "image_placeholder",
+                "cooking_time",
+                "author",
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        condition = ""
+        if limit is not None:
+            condition = "WHERE recipe_rank <= %s"
+            params = (*params, limit)
+        for recipe in Recipe.objects.raw(
+            f"SELECT * FROM ({sql}) ranked {condition} "
+            "ORDER BY author_id, recipe_rank",
+            params,
+        ):
+            latest[recipe.author_id].append(recipe)
+    for author in authors:
+        author.latest_recipes = latest[author.pk]
@@ -0,0 +1,26 @@
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import Version
+
+
+def bump_version(*names):
+    updated = Version.objects.filter(name__in=names).update(
+        value=F("value") + 1, modified=timezone.now()
+    )
+    if updated < len(names):
+        Version.objects.bulk_create(
+            (Version(name=name, value=1) for name in names),
+            ignore_conflicts=True,
+        )
+
+
+def get_versions(*names):
+    versions = dict.fromkeys(names, (0, None))
+    versions.update(
+        (name, (value, modified))
+        for name, value, modified in Version.objects.filter(
+            name__in=names
+        ).values_list("name", "value", "modified")
+    )
+    return versions
@@ -1,15 +1,14 @@
-import io
+import os
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F, Q, Sum
-from django.http import FileResponse
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from djoser.views import UserViewSet as DjoserUserViewSet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import (
     AllowAny,
     DjangoModelPermissions,
@@ -18,42 +17,132 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.constant import ONE_TRUE_CONST, ZERO_FALSE_CONST
-from api.filters import IngredientFilter
-from api.mixins import GetPostDeleteMixin
-from api.paginators import PageLimitPagination
+from api.carts import carts_changed, recipe_removed_from_carts
+from api.catalog import catalog
+from api.constant import CATALOG_VERSION, RECIPES_VERSION, USER_VERSION
+from api.feed import get_feed_sources, subscribe_feed, unsubscribe_feed
+from api.fieldsets import Fieldset
+from api.filters import RecipeFilter
+from api.mixins import ConditionalGetMixin, GetPostDeleteMixin
+from api.paginators import FeedPagination, PageLimitOrCursorPagination
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
     FavoriteCartRecipeSerializer,
+    IdsSerializer,
     IngredientSerializer,
     RecipeGetSerializer,
     RecipeSerializer,
     TagSerializer,
     UserSubscribeSerializer,
 )
+from api.shopping import (
+    EXPORT_FAILED,
+    EXPORT_PENDING,
+    EXPORT_READY,
+    SHOPPING_LIST_FORMATS,
+    build_shopping_list,
+    content_disposition,
+    get_shopping_list_name,
+    load_export,
+    open_shopping_list,
+    start_export,
+    stream_shopping_list,
+)
+from api.utils import (
+    annotate_is_subscribed,
+    annotate_recipes,
+    get_user_links,
+    touch_author_recipes,
+    update_counter,
+    user_links_deleted,
+)
+from api.versions import bump_version
 from recipes.models import Carts, Favorites, Ingredient, Recipe, Tag
 from users.models import Subscriptions
 
 User = get_user_model()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class CatalogViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    permission_classes = (AllowAny,)
+    lookup_value_regex = "[0-9]+"
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(self.list_catalog, request)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            self.retrieve_catalog, request, *args, **kwargs
+        )
+
+    def retrieve_catalog(self, request, pk):
+        obj = self.get_from_catalog(int(pk))
+        if obj is None:
+            raise NotFound
+        return Response(obj)
+
+
+class TagViewSet(CatalogViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    permission_classes = (AllowAny,)
 
+    def list_catalog(self, request):
+        return Response(catalog.get_tags())
+
+    def get_from_catalog(self, pk):
+        return catalog.get_tag(pk)
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+
+class IngredientViewSet(CatalogViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    permission_classes = (AllowAny,)
-    filterset_class = IngredientFilter
+
+    def list_catalog(self, request):
+        return Response(
+            catalog.search_ingredients(
+                name=request.query_params.get("name"),
+                measurement_unit=request.query_params.get("measurement_unit"),
+            )
+        )
+
+    def get_from_catalog(self, pk):
+        return catalog.get_ingredient(pk)
 
 
 class UserViewSet(DjoserUserViewSet, GetPostDeleteMixin):
-    pagination_class = PageLimitPagination
+    pagination_class = PageLimitOrCursorPagination
+    cursor_ordering = ("username", "id")
     permission_classes = (DjangoModelPermissions,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not Fieldset.from_request(self.request).includes("is_subscribed"):
+            return queryset
+        return annotate_is_subscribed(queryset, self.request.user)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            links = get_user_links(User.objects.filter(pk=instance.pk))
+            instance.delete()
+            user_links_deleted(links)
+
+    @action(
+        methods=("POST",),
+        detail=False,
+        url_path=f"set_{User.USERNAME_FIELD}",
+    )
+    def set_username(self, request, *args, **kwargs):
+        response = super().set_username(request, *args, **kwargs)
+        touch_author_recipes([request.user])
+        return response
+
+    def linked_created(self, author):
+        author.is_subscribed = True
+        subscribe_feed(self.request.user, author)
+
+    def linked_deleted(self, pk):
+        unsubscribe_feed(self.request.user, pk)
+
     @action(
         methods=(
             "GET",
@@ -65,7 +154,11 @@ class UserViewSet(DjoserUserViewSet, GetPostDeleteMixin):
     )
     def subscribe(self, request, id):
         return self.get_post_delete(
-            id, Subscriptions, UserSubscribeSerializer, Q(author__id=id)
+            id,
+            Subscriptions,
+            UserSubscribeSerializer,
+            Q(author__id=id),
+            "subscribers_count",
         )
 
     @action(
@@ -77,53 +170,61 @@ class UserViewSet(DjoserUserViewSet, GetPostDeleteMixin):
         if self.request.user.is_anonymous:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-        pages = self.paginate_queryset(
-            User.objects.filter(subscribers__user=self.request.user)
-        )
+        queryset = User.objects.filter(subscribers__user=self.request.user)
+        if Fieldset.from_request(request).includes("is_subscribed"):
+            queryset = annotate_is_subscribed(queryset, self.request.user)
+        pages = self.paginate_queryset(queryset)
         serializer = UserSubscribeSerializer(
             pages, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(ModelViewSet, GetPostDeleteMixin):
-    queryset = Recipe.objects.select_related("author")
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet, GetPostDeleteMixin):
+    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageLimitPagination
+    pagination_class = PageLimitOrCursorPagination
+    cursor_ordering = ("-pub_date", "-id")
+    filterset_class = RecipeFilter
 
     def get_queryset(self):
-        queryset = self.queryset
-
-        tags = self.request.query_params.getlist("tags")
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-        author = self.request.query_params.get("author")
-        if author:
-            queryset = queryset.filter(author=author)
-        if self.request.user.is_anonymous:
-            return queryset
-
-        is_in_shopping_cart = self.request.query_params.get(
-            "is_in_shopping_cart"
+        return annotate_recipes(
+            self.queryset,
+            self.request.user,
+            Fieldset.from_request(self.request),
         )
-        if is_in_shopping_cart in ONE_TRUE_CONST:
-            queryset = queryset.filter(in_carts__user=self.request.user)
-        elif is_in_shopping_cart in ZERO_FALSE_CONST:
-            queryset = queryset.exclude(in_carts__user=self.request.user)
-
-        is_favorited = self.request.query_params.get("is_favorited")
-        if is_favorited in ONE_TRUE_CONST:
-            queryset = queryset.filter(in_favorites__user=self.request.user)
-        if is_favorited in ZERO_FALSE_CONST:
-            queryset = queryset.exclude(in_favorites__user=self.request.user)
-
-        return queryset
 
     def get_serializer_class(self):
         if self.request.method in ("GET",):
             return RecipeGetSerializer
         return RecipeSerializer
 
+    def get_version_names(self):
+        if self.request.user.is_anonymous:
+            return (RECIPES_VERSION, CATALOG_VERSION)
+        return (
+            RECIPES_VERSION,
+            CATALOG_VERSION,
+            USER_VERSION.format(self.request.user.id),
+        )
+
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == "download_shopping_cart":
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    def links_changed(self, linked_model, pks, delta):
+        if linked_model is Carts:
+            carts_changed(self.request.user.pk, pks, delta)
+
+    def perform_destroy(self, recipe):
+        with transaction.atomic():
+            if recipe.author is not None:
+                update_counter(recipe.author, "recipes_count", -1)
+            recipe_removed_from_carts(recipe)
+            recipe.delete()
+            bump_version(RECIPES_VERSION)
+
     @action(
         methods=(
             "GET",
@@ -135,7 +236,11 @@ class RecipeViewSet(ModelViewSet, GetPostDeleteMixin):
     )
     def favorite(self, request, pk):
         return self.get_post_delete(
-            pk, Favorites, FavoriteCartRecipeSerializer, Q(recipe__id=pk)
+            pk,
+            Favorites,
+            FavoriteCartRecipeSerializer,
+            Q(recipe__id=pk),
+            "favorites_count",
         )
 
     @action(
@@ -149,60 +254,161 @@ class RecipeViewSet(ModelViewSet, GetPostDeleteMixin):
     )
     def shopping_cart(self, request, pk):
         return self.get_post_delete(
-            pk, Carts, FavoriteCartRecipeSerializer, Q(recipe__id=pk)
+            pk,
+            Carts,
+            FavoriteCartRecipeSerializer,
+            Q(recipe__id=pk),
+            "carts_count",
         )
 
+    @action(
+        methods=(
+            "POST",
+            "DELETE",
+        ),
+        detail=False,
+        url_path="favorite",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_post_delete(
+            Favorites, "recipe", IdsSerializer, "favorites_count"
+        )
+
+    @action(
+        methods=(
+            "POST",
+            "DELETE",
+        ),
+        detail=False,
+        url_path="shopping_cart",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request):
+        return self.bulk_post_delete(
+            Carts, "recipe", IdsSerializer, "carts_count"
+        )
+
+    @action(
+        methods=("GET",),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        paginator = FeedPagination()
+        entries = paginator.paginate_queryset(
+            get_feed_sources(request.user), request
+        )
+        recipes = annotate_recipes(
+            Recipe.objects.filter(pk__in=[pk for _, pk in entries]),
+            request.user,
+            Fieldset.from_request(request),
+        ).in_bulk()
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for _, pk in entries if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         methods=("GET",),
         detail=False,
     )
     def download_shopping_cart(self, request):
         user = self.request.user
-        if not user.carts.exists():
+        shopping_format = request.query_params.get("format", "pdf")
+        if (
+            shopping_format != "pdf"
+            and shopping_format not in SHOPPING_LIST_FORMATS
+        ):
+            return Response(
+                {
+                    "format": (
+                        "Поддерживаемые форматы: pdf, "
+                        f"{', '.join(SHOPPING_LIST_FORMATS)}."
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipes = user.carts.count()
+        if not recipes:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        ingredients = (
-            Ingredient.objects.filter(recipe__recipe__in_carts__user=user)
-            .values("name", measurement=F("measurement_unit"))
-            .annotate(amount=Sum("recipe__amount"))
-        )
-
-        font = "Montserrat-SemiBold"
-        pdfmetrics.registerFont(
-            TTFont("Montserrat-SemiBold", "Montserrat-SemiBold.ttf", "UTF-8")
-        )
-        buffer = io.BytesIO()
-        pdf_file = canvas.Canvas(buffer)
-        pdf_file.setFont(font, 16)
-        date_now = timezone.localtime(timezone.now())
-        pdf_file.drawString(
-            50,
-            800,
-            f"{date_now.strftime('%d/%m/%Y %H:%M')}",
-        )
-
-        pdf_file.drawString(50, 750, f"Список покупок для: {user.first_name}")
-        pdf_file.setFont(font, 14)
-        from_bottom = 700
-        for ingredient in ingredients:
-            pdf_file.drawString(
-                50,
-                from_bottom,
-                (
-                    f"{ingredient['name']}: "
-                    f"{ingredient['amount']} {ingredient['measurement']}"
-                ),
+        filename = f"{user.username}_shopping_list.{shopping_format}"
+        if shopping_format != "pdf":
+            return self.get_shopping_list_stream(
+                user, shopping_format, filename
+            )
+        name = get_shopping_list_name(user)
+        shopping_list = open_shopping_list(name)
+        if shopping_list is None:
+            if recipes > settings.SHOPPING_LIST_SYNC_LIMIT:
+                return self.get_export_response(
+                    start_export(user, name, filename), EXPORT_PENDING
+                )
+            shopping_list = build_shopping_list(user, name)
+        return self.get_shopping_list_response(name, shopping_list, filename)
+
+    @action(
+        methods=("GET",),
+        detail=False,
+        url_path=r"download_shopping_cart/(?P<token>[^/.]+)",
+        permission_classes=(AllowAny,),
+    )
+    def download_shopping_cart_export(self, request, token):
+        name, filename, export_status = load_export(token)
+        if export_status is None:
+            raise NotFound("Список покупок не найден, запросите его заново.")
+        if export_status == EXPORT_READY:
+            shopping_list = open_shopping_list(name)
+            if shopping_list is None:
+                raise NotFound(
+                    "Список покупок не найден, запросите его заново."
+                )
+            return self.get_shopping_list_response(
+                name, shopping_list, filename
+            )
+        return self.get_export_response(token, export_status)
+
+    def get_export_response(self, token, export_status):
+        url = self.reverse_action(
+            "download-shopping-cart-export", kwargs={"token": token}
+        )
+        response = Response(
+            {"id": token, "status": export_status, "url": url},
+            status=(
+                status.HTTP_200_OK
+                if export_status == EXPORT_FAILED
+                else status.HTTP_202_ACCEPTED
+            ),
+        )
+        response["Location"] = url
+        return response
+
+    def get_shopping_list_stream(self, user, shopping_format, filename):
+        _, content_type = SHOPPING_LIST_FORMATS[shopping_format]
+        response = StreamingHttpResponse(
+            stream_shopping_list(user, shopping_format),
+            content_type=content_type,
+        )
+        if shopping_format != "json":
+            response["Content-Disposition"] = content_disposition(filename)
+        return response
+
+    def get_shopping_list_response(self, name, shopping_list, filename):
+        if settings.SHOPPING_LIST_ACCEL_REDIRECT:
+            shopping_list.close()
+            response = HttpResponse(content_type="application/pdf")
+            response["X-Accel-Redirect"] = (
+                f"{settings.SHOPPING_LIST_ACCEL_REDIRECT}{name}"
             )
-            from_bottom -= 20
-            if from_bottom <= 50:
-                from_bottom = 700
-                pdf_file.showPage()
-                pdf_file.setFont(font, 14)
-        pdf_file.showPage()
-        pdf_file.save()
-        buffer.seek(0)
-        return FileResponse(
-            buffer,
+            response["Content-Disposition"] = content_disposition(filename)
+            return response
+        response = FileResponse(
+            shopping_list,
             as_attachment=True,
-            filename=f"{user.username}_shopping_list.pdf",
+            filename=filename,
         )
+        response["Content-Length"] = os.fstat(shopping_list.fileno()).st_size
+        return response
@@ -92,6 +92,33 @@ else:
         }
     }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", default="naizi"),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = 60 * 60
+CATALOG_CHECK_INTERVAL = 5
+FEED_FANOUT_LIMIT = 10000
+FEED_FANOUT_RESUME_LIMIT = 9000
+FEED_BACKFILL_SIZE = 100
+FEED_BACKFILL_WORKERS = 1
+IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+IDEMPOTENCY_LEASE = 60 * 5
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_ORIGINAL_QUALITY = 95
+RECIPE_IMAGE_VARIANTS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1200,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -126,6 +153,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/backend_media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "backend_media")
 
+FILE_UPLOAD_CHUNK_SIZE = 64 * 1024
+FILE_UPLOAD_HANDLERS = [
+    "api.uploadhandlers.ChunkedTemporaryFileUploadHandler",
+]
+MEDIA_GC_GRACE = 60 * 60
+
+SHOPPING_LIST_ROOT = os.path.join(BASE_DIR, "shopping_lists")
+SHOPPING_LIST_SYNC_LIMIT = 20
+SHOPPING_LIST_WORKERS = 1
+SHOPPING_LIST_EXPORT_TIMEOUT = 60 * 60
+SHOPPING_LIST_STREAM_CHUNK = 16 * 1024
+SHOPPING_LIST_ACCEL_REDIRECT = os.getenv(
+    "SHOPPING_LIST_ACCEL_REDIRECT", default=""
+)
+
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -139,6 +181,17 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend"
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "api.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "rest_framework.parsers.JSONParser",
+        "api.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 DJOSER = {
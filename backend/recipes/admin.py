@@ -1,12 +1,26 @@
 from django.contrib import admin
 from django.contrib.admin import register
+from django.db import transaction
 
-from recipes.models import (AmountIngredient, Carts, Favorites, Ingredient,
-                            Recipe, Tag)
+from api.carts import (carts_changed, recipe_amounts_changed,
+                       recipe_removed_from_carts)
+from api.constant import CATALOG_VERSION
+from api.feed import fan_out_recipe
+from api.images import schedule_image_processing
+from api.mixins import (CounterAdminMixin, UserVersionAdminMixin,
+                        VersionAdminMixin)
+from api.utils import touch_recipes
+from recipes.models import (AmountIngredient, Carts, Favorites, FeedEntry,
+                            Ingredient, Recipe, Tag)
+
+
+class CatalogVersionAdminMixin(VersionAdminMixin):
+    def get_version_names(self, objs):
+        return (CATALOG_VERSION,)
 
 
 @register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(CatalogVersionAdminMixin, admin.ModelAdmin):
     list_display = ("id", "name", "color", "slug")
     search_fields = ("name", "color", "slug")
     list_filter = (
@@ -19,7 +33,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(CatalogVersionAdminMixin, admin.ModelAdmin):
     list_display = ("id", "name", "measurement_unit")
     search_fields = ("name", "measurement_unit")
     list_filter = ("name",)
@@ -28,8 +42,14 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "author", "count_favorites")
+class RecipeAdmin(CounterAdminMixin, VersionAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "id",
+        "name",
+        "author",
+        "favorites_count",
+        "carts_count",
+    )
     search_fields = (
         "username",
         "email",
@@ -43,13 +63,32 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     ordering = ("name",)
     empty_value_display = "-пусто-"
+    counters = {"author": "recipes_count"}
+
+    def save_model(self, request, obj, form, change):
+        if "image" in form.changed_data:
+            obj.image_variants, obj.image_placeholder = {}, ""
+        super().save_model(request, obj, form, change)
+        if "image" in form.changed_data:
+            schedule_image_processing(obj)
+        if not change or "author" in form.changed_data:
+            FeedEntry.objects.filter(recipe=obj).delete()
+            fan_out_recipe(obj)
 
-    def count_favorites(self, obj):
-        return obj.in_favorites.count()
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            recipe_removed_from_carts(obj)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for recipe in queryset:
+                recipe_removed_from_carts(recipe)
+            super().delete_queryset(request, queryset)
 
 
 @register(AmountIngredient)
-class AmountIngredientAdmin(admin.ModelAdmin):
+class AmountIngredientAdmin(VersionAdminMixin, admin.ModelAdmin):
     list_display = ("id", "recipe", "ingredients", "amount")
     search_fields = (
         "recipe",
@@ -61,9 +100,45 @@ class AmountIngredientAdmin(admin.ModelAdmin):
     )
     empty_value_display = "-пусто-"
 
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            recipe, old = obj.recipe_id, {}
+            if change:
+                recipe = form.initial["recipe"]
+                old = {form.initial["ingredients"]: form.initial["amount"]}
+            if recipe != obj.recipe_id:
+                recipe_amounts_changed(recipe, old, {})
+                old = {}
+            recipe_amounts_changed(
+                obj.recipe_id, old, {obj.ingredients_id: obj.amount}
+            )
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self.amounts_deleted([obj])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            objs = list(queryset)
+            super().delete_queryset(request, queryset)
+            self.amounts_deleted(objs)
+
+    def amounts_deleted(self, objs):
+        for obj in objs:
+            recipe_amounts_changed(
+                obj.recipe_id, {obj.ingredients_id: obj.amount}, {}
+            )
+
+    def versions_changed(self, objs):
+        touch_recipes({obj.recipe_id for obj in objs})
+
 
 @register(Favorites)
-class FavoritesAdmin(admin.ModelAdmin):
+class FavoritesAdmin(
+    CounterAdminMixin, UserVersionAdminMixin, admin.ModelAdmin
+):
     list_display = ("id", "user", "recipe")
     search_fields = (
         "user",
@@ -74,10 +149,11 @@ class FavoritesAdmin(admin.ModelAdmin):
         "recipe",
     )
     empty_value_display = "-пусто-"
+    counters = {"recipe": "favorites_count"}
 
 
 @register(Carts)
-class CartsAdmin(admin.ModelAdmin):
+class CartsAdmin(CounterAdminMixin, UserVersionAdminMixin, admin.ModelAdmin):
     list_display = ("id", "user", "recipe")
     search_fields = (
         "user",
@@ -88,3 +164,30 @@ class CartsAdmin(admin.ModelAdmin):
         "recipe",
     )
     empty_value_display = "-пусто-"
+    counters = {"recipe": "carts_count"}
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if change and not {"user", "recipe"} & set(form.changed_data):
+                return
+            if change:
+                carts_changed(
+                    form.initial["user"], (form.initial["recipe"],), -1
+                )
+            carts_changed(obj.user_id, (obj.recipe_id,), 1)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self.carts_deleted([obj])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            objs = list(queryset)
+            super().delete_queryset(request, queryset)
+            self.carts_deleted(objs)
+
+    def carts_deleted(self, objs):
+        for obj in objs:
+            carts_changed(obj.user_id, (obj.recipe_id,), -1)
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def reinstall_search_triggers(using, **kwargs):
+    from recipes.search import install_search_index
+
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        install_search_index(connection)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
+
+    def ready(self):
+        post_migrate.connect(reinstall_search_triggers, sender=self)
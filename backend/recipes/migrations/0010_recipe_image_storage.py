@@ -0,0 +1,20 @@
+# Generated by Django 3.2.4 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipe_images/', verbose_name='Изображение рецепта'),
+        ),
+    ]
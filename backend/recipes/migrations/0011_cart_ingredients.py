@@ -0,0 +1,63 @@
+# Generated by Django 3.2.4 on 2026-10-18 01:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_cart_ingredients(apps, schema_editor):
+    CartIngredient = apps.get_model('recipes', 'CartIngredient')
+    Carts = apps.get_model('recipes', 'Carts')
+    CartIngredient.objects.bulk_create(
+        (
+            CartIngredient(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['amount'],
+                recipes_count=row['recipes_count'],
+            )
+            for row in Carts.objects.filter(
+                recipe__ingredient__isnull=False
+            )
+            .values(
+                'user_id',
+                ingredient_id=models.F('recipe__ingredient__ingredients'),
+            )
+            .annotate(
+                amount=models.Sum('recipe__ingredient__amount'),
+                recipes_count=models.Count('recipe'),
+            )
+            .order_by()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Рецептов с ингредиентом')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_cart_lists', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Автор списка покупок')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_ingredient'),
+        ),
+        migrations.RunPython(fill_cart_ingredients, migrations.RunPython.noop),
+    ]
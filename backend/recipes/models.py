@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxLengthValidator, MinValueValidator
 from django.db.models import (CASCADE, SET_NULL, CharField, DateTimeField,
-                              ForeignKey, ImageField, ManyToManyField, Model,
+                              ForeignKey, ImageField, Index, JSONField,
+                              ManyToManyField, Model, PositiveIntegerField,
                               PositiveSmallIntegerField, TextField,
                               UniqueConstraint)
 
+from .storage import content_storage
 from .validators import valid_hex_color
 
 User = get_user_model()
@@ -117,9 +119,25 @@ class Recipe(Model):
         auto_now_add=True,
         editable=False,
     )
+    modified = DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
     image = ImageField(
         verbose_name="Изображение рецепта",
         upload_to="recipe_images/",
+        storage=content_storage,
+    )
+    image_variants = JSONField(
+        verbose_name="Варианты изображения",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    image_placeholder = TextField(
+        verbose_name="Заглушка изображения",
+        blank=True,
+        editable=False,
     )
     text = TextField(
         verbose_name="Описание рецепта",
@@ -134,6 +152,16 @@ class Recipe(Model):
             ),
         ),
     )
+    favorites_count = PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    carts_count = PositiveIntegerField(
+        verbose_name="В списках покупок",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Рецепт"
@@ -145,6 +173,16 @@ class Recipe(Model):
                 name="unique_recipe_author",
             ),
         )
+        indexes = (
+            Index(
+                fields=("-pub_date", "-id"),
+                name="recipe_pub_date_id_idx",
+            ),
+            Index(
+                fields=("author", "-pub_date", "-id"),
+                name="recipe_author_pub_date_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.name}. Автор: {self.author.username}"
@@ -218,6 +256,12 @@ class Favorites(Model):
                 name="unique_favorite_recipe_user",
             ),
         )
+        indexes = (
+            Index(
+                fields=("user", "recipe"),
+                name="favorite_user_recipe_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"Рецепт {self.recipe} в избранном у{self.user}"
@@ -252,6 +296,86 @@ class Carts(Model):
                 name="unique_cart_recipe_user",
             ),
         )
+        indexes = (
+            Index(
+                fields=("user", "recipe"),
+                name="cart_user_recipe_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
+
+
+class CartIngredient(Model):
+    user = ForeignKey(
+        to=User,
+        verbose_name="Автор списка покупок",
+        related_name="cart_ingredients",
+        on_delete=CASCADE,
+    )
+    ingredient = ForeignKey(
+        to=Ingredient,
+        verbose_name="Ингредиент",
+        related_name="in_cart_lists",
+        on_delete=CASCADE,
+    )
+    amount = PositiveIntegerField(
+        verbose_name="Количество",
+        default=0,
+    )
+    recipes_count = PositiveIntegerField(
+        verbose_name="Рецептов с ингредиентом",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = (
+            UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_cart_ingredient",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.ingredient}: {self.amount} у {self.user}"
+
+
+class FeedEntry(Model):
+    user = ForeignKey(
+        to=User,
+        verbose_name="Подписчик",
+        related_name="feed",
+        on_delete=CASCADE,
+    )
+    recipe = ForeignKey(
+        to=Recipe,
+        verbose_name="Рецепт",
+        related_name="feed_entries",
+        on_delete=CASCADE,
+    )
+    pub_date = DateTimeField(
+        verbose_name="Дата публикации",
+        editable=False,
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = (
+            UniqueConstraint(
+                fields=("user", "recipe"),
+                name="unique_feed_entry",
+            ),
+        )
+        indexes = (
+            Index(
+                fields=("user", "-pub_date", "-recipe"),
+                name="feed_user_pub_date_idx",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.recipe} в ленте {self.user}"
@@ -0,0 +1,144 @@
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = "russian"
+SEARCH_INDEX = "recipe_search_vector_idx"
+FTS_TABLE = "recipes_recipe_fts"
+
+POSTGRESQL_INSTALL = (
+    f"""
+    ALTER TABLE recipes_recipe
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS {SEARCH_INDEX}
+    ON recipes_recipe USING gin (search_vector)
+    """,
+)
+POSTGRESQL_UNINSTALL = (
+    f"DROP INDEX IF EXISTS {SEARCH_INDEX}",
+    "ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector",
+)
+
+SQLITE_INSTALL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text,
+        content='recipes_recipe',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_UNINSTALL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+
+def execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_search_index(connection):
+    if connection.vendor == "postgresql":
+        execute(connection, POSTGRESQL_INSTALL)
+    elif connection.vendor == "sqlite":
+        execute(connection, SQLITE_INSTALL)
+
+
+def uninstall_search_index(connection):
+    if connection.vendor == "postgresql":
+        execute(connection, POSTGRESQL_UNINSTALL)
+    elif connection.vendor == "sqlite":
+        execute(connection, SQLITE_UNINSTALL)
+
+
+def rebuild_search_index(connection):
+    install_search_index(connection)
+    if connection.vendor == "postgresql":
+        execute(connection, (f"REINDEX INDEX {SEARCH_INDEX}",))
+    elif connection.vendor == "sqlite":
+        execute(
+            connection,
+            (f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",),
+        )
+
+
+def sqlite_match_query(query):
+    words = query.replace('"', " ").split()
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        match = RawSQL(
+            f"recipes_recipe.search_vector @@ {tsquery}",
+            (query,),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"ts_rank(recipes_recipe.search_vector, {tsquery})",
+            (query,),
+            output_field=FloatField(),
+        )
+    elif connection.vendor == "sqlite":
+        query = sqlite_match_query(query)
+        if not query:
+            return queryset.none()
+        match = RawSQL(
+            f"recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s)",
+            (query,),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id)",
+            (query,),
+            output_field=FloatField(),
+        )
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+
+    return (
+        queryset.filter(match)
+        .annotate(search_rank=rank)
+        .order_by("-search_rank", "-pub_date", "-id")
+    )
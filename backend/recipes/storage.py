@@ -0,0 +1,38 @@
+import os
+from hashlib import sha256
+from pathlib import PurePosixPath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_content_name(self, name, content):
+        digest = sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        path = PurePosixPath(name)
+        return str(
+            path.parent / digest[:2] / f"{digest}{path.suffix.lower()}"
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+    def walk(self, path=""):
+        directories, files = self.listdir(path)
+        for file in files:
+            yield str(PurePosixPath(path) / file)
+        for directory in directories:
+            yield from self.walk(str(PurePosixPath(path) / directory))
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from api.catalog import catalog
+from api.utils import update_counter
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+
+class BaseTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.version = catalog.checked = catalog.forced = None
+
+    def create_user(self, username):
+        return CustomUser.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="password",
+            first_name=username,
+            last_name=username,
+        )
+
+    def create_ingredient(self, name, measurement_unit="г"):
+        return Ingredient.objects.create(
+            name=name, measurement_unit=measurement_unit
+        )
+
+    def create_recipe(self, author, name, amounts=None):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name,
+            text=name,
+            cooking_time=10,
+            image=f"recipe_images/{name}.jpg",
+        )
+        tag, _ = Tag.objects.get_or_create(
+            slug="breakfast", defaults={"name": "Завтрак", "color": "#FF0000"}
+        )
+        recipe.tags.add(tag)
+        update_counter(author, "recipes_count", 1)
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                recipe=recipe, ingredients=ingredient, amount=amount
+            )
+            for ingredient, amount in (amounts or {}).items()
+        )
+        return recipe
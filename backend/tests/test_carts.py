@@ -0,0 +1,181 @@
+from api.carts import compute_cart_ingredients
+from recipes.models import AmountIngredient, CartIngredient, Carts
+from tests.base import BaseTestCase
+from users.models import CustomUser
+
+
+class CartIngredientsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.user = self.create_user("reader")
+        self.flour = self.create_ingredient("мука")
+        self.milk = self.create_ingredient("молоко", "мл")
+        self.pancakes = self.create_recipe(
+            self.author, "pancakes", {self.flour: 200, self.milk: 300}
+        )
+        self.porridge = self.create_recipe(
+            self.author, "porridge", {self.milk: 500}
+        )
+        self.client.force_authenticate(self.user)
+
+    def get_aggregate(self, user=None):
+        return {
+            ingredient_id: (amount, recipes_count)
+            for ingredient_id, amount, recipes_count in (
+                CartIngredient.objects.filter(
+                    user=user or self.user
+                ).values_list("ingredient_id", "amount", "recipes_count")
+            )
+        }
+
+    def assertAggregate(self, expected, user=None):
+        user = user or self.user
+        self.assertEqual(self.get_aggregate(user), expected)
+        self.assertEqual(
+            {
+                ingredient_id: value
+                for (_, ingredient_id), value in compute_cart_ingredients(
+                    (user.pk,)
+                ).items()
+            },
+            expected,
+        )
+
+
+class CartIngredientsTests(CartIngredientsTestCase):
+    def add_to_cart(self, recipe):
+        return self.client.post(f"/api/recipes/{recipe.pk}/shopping_cart/")
+
+    def test_add_and_remove(self):
+        self.add_to_cart(self.pancakes)
+        self.add_to_cart(self.porridge)
+        self.assertAggregate(
+            {self.flour.pk: (200, 1), self.milk.pk: (800, 2)}
+        )
+
+        self.client.delete(f"/api/recipes/{self.pancakes.pk}/shopping_cart/")
+        self.assertAggregate({self.milk.pk: (500, 1)})
+
+    def test_repeated_add_and_remove_change_nothing(self):
+        self.add_to_cart(self.pancakes)
+        self.assertEqual(self.add_to_cart(self.pancakes).status_code, 400)
+        self.client.post(
+            "/api/recipes/shopping_cart/",
+            {"ids": [self.pancakes.pk, self.pancakes.pk]},
+            format="json",
+        )
+        self.assertAggregate(
+            {self.flour.pk: (200, 1), self.milk.pk: (300, 1)}
+        )
+
+        for _ in range(2):
+            self.client.delete(
+                "/api/recipes/shopping_cart/",
+                {"ids": [self.pancakes.pk]},
+                format="json",
+            )
+        self.assertAggregate({})
+
+    def test_recipe_edit_updates_carts(self):
+        self.add_to_cart(self.pancakes)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f"/api/recipes/{self.pancakes.pk}/",
+            {
+                "name": self.pancakes.name,
+                "text": self.pancakes.text,
+                "cooking_time": self.pancakes.cooking_time,
+                "tags": list(self.pancakes.tags.values_list("pk", flat=True)),
+                "ingredients": [{"id": self.milk.pk, "amount": 250}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertAggregate({self.milk.pk: (250, 1)})
+
+        self.client.delete(f"/api/recipes/{self.pancakes.pk}/")
+        self.assertAggregate({})
+
+
+class CartIngredientsAdminTests(CartIngredientsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            CustomUser.objects.create_superuser(
+                username="admin",
+                email="admin@example.com",
+                password="password",
+            )
+        )
+        self.add_to_cart(self.pancakes)
+
+    def add_to_cart(self, recipe, user=None):
+        return self.client.post(
+            "/admin/recipes/carts/add/",
+            {"user": (user or self.user).pk, "recipe": recipe.pk},
+        )
+
+    def test_cart_change_moves_amounts(self):
+        cart = Carts.objects.get()
+        other = self.create_user("other")
+        self.client.post(
+            f"/admin/recipes/carts/{cart.pk}/change/",
+            {"user": other.pk, "recipe": self.porridge.pk},
+        )
+        self.assertAggregate({})
+        self.assertAggregate({self.milk.pk: (500, 1)}, other)
+
+    def test_cart_delete(self):
+        self.add_to_cart(self.porridge)
+        self.client.post(
+            "/admin/recipes/carts/",
+            {
+                "action": "delete_selected",
+                "_selected_action": list(
+                    Carts.objects.values_list("pk", flat=True)
+                ),
+                "post": "yes",
+            },
+        )
+        self.assertFalse(Carts.objects.exists())
+        self.assertAggregate({})
+
+    def test_amount_edit_and_delete(self):
+        amount = AmountIngredient.objects.get(
+            recipe=self.pancakes, ingredients=self.flour
+        )
+        self.client.post(
+            f"/admin/recipes/amountingredient/{amount.pk}/change/",
+            {
+                "recipe": self.pancakes.pk,
+                "ingredients": self.flour.pk,
+                "amount": 50,
+            },
+        )
+        self.assertAggregate({self.flour.pk: (50, 1), self.milk.pk: (300, 1)})
+
+        self.client.post(
+            f"/admin/recipes/amountingredient/{amount.pk}/change/",
+            {
+                "recipe": self.porridge.pk,
+                "ingredients": self.flour.pk,
+                "amount": 50,
+            },
+        )
+        self.assertAggregate({self.milk.pk: (300, 1)})
+
+        self.client.post(
+            f"/admin/recipes/amountingredient/{amount.pk}/delete/",
+            {"post": "yes"},
+        )
+        self.assertFalse(AmountIngredient.objects.filter(pk=amount.pk))
+        self.assertAggregate({self.milk.pk: (300, 1)})
+
+    def test_recipe_delete(self):
+        self.client.post(
+            f"/admin/recipes/recipe/{self.pancakes.pk}/delete/",
+            {"post": "yes"},
+        )
+        self.assertFalse(Carts.objects.exists())
+        self.assertAggregate({})
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from api.feed import backfill_followers, run_backfill
+from recipes.models import FeedEntry
+from tests.base import BaseTestCase
+
+
+@override_settings(FEED_FANOUT_LIMIT=2, FEED_FANOUT_RESUME_LIMIT=1)
+class FeedModeTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.recipe = self.create_recipe(self.author, "soup")
+        self.readers = [self.create_user(f"reader{i}") for i in range(3)]
+        self.url = f"/api/users/{self.author.pk}/subscribe/"
+
+    def request(self, method, reader):
+        self.client.force_authenticate(reader)
+        with mock.patch("api.feed.submit_to_pool") as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, method)(self.url)
+        self.assertIn(response.status_code, (201, 204))
+        self.author.refresh_from_db()
+        return submit
+
+    def get_feed(self, reader):
+        self.client.force_authenticate(reader)
+        return [
+            recipe["id"]
+            for recipe in self.client.get("/api/recipes/feed/").json()[
+                "results"
+            ]
+        ]
+
+    def test_author_switches_to_pull_above_limit(self):
+        for reader in self.readers:
+            self.request("post", reader)
+        self.assertTrue(self.author.feed_pull)
+        self.assertFalse(FeedEntry.objects.filter(user=self.readers[2]))
+        for reader in self.readers:
+            self.assertEqual(self.get_feed(reader), [self.recipe.pk])
+
+    def test_backfill_waits_for_resume_limit(self):
+        for reader in self.readers:
+            self.request("post", reader)
+        submit = self.request("delete", self.readers[2])
+        submit.assert_not_called()
+        self.assertTrue(self.author.feed_pull)
+
+        submit = self.request("delete", self.readers[1])
+        submit.assert_called_once_with(
+            "feed-backfill", 1, run_backfill, [self.author.pk]
+        )
+        self.assertTrue(self.author.feed_pull)
+        self.assertEqual(self.get_feed(self.readers[0]), [self.recipe.pk])
+
+        backfill_followers([self.author.pk])
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.feed_pull)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.readers[0], recipe=self.recipe)
+        )
+        self.assertEqual(self.get_feed(self.readers[0]), [self.recipe.pk])
+
+    def test_resubscribe_near_limit_does_not_refan(self):
+        for reader in self.readers:
+            self.request("post", reader)
+        for _ in range(3):
+            self.request("delete", self.readers[2]).assert_not_called()
+            self.request("post", self.readers[2]).assert_not_called()
+        self.assertTrue(self.author.feed_pull)
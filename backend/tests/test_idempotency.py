@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.models import IdempotencyKey
+from recipes.models import Favorites, Recipe
+from tests.base import BaseTestCase
+
+
+class IdempotencyTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        self.recipe = self.create_recipe(self.create_user("author"), "soup")
+        self.url = f"/api/recipes/{self.recipe.pk}/favorite/"
+        self.client.force_authenticate(self.user)
+
+    def post(self, key):
+        return self.client.post(self.url, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_saved_response(self):
+        first = self.post("retry")
+        second = self.post("retry")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Favorites.objects.filter(user=self.user).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_new_key_runs_request_again(self):
+        self.post("first")
+        response = self.post("second")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+
+    def test_request_in_progress_conflicts(self):
+        self.post("busy")
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(self.post("busy").status_code, 409)
+
+    def test_expired_key_is_forgotten(self):
+        self.post("old")
+        IdempotencyKey.objects.update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        Favorites.objects.all().delete()
+        Recipe.objects.update(favorites_count=0)
+        response = self.post("old")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+
+    def test_abandoned_request_is_taken_over_after_lease(self):
+        self.post("lost")
+        IdempotencyKey.objects.update(
+            status_code=None,
+            response=None,
+            created=timezone.now() - timedelta(minutes=10),
+        )
+        Favorites.objects.all().delete()
+        Recipe.objects.update(favorites_count=0)
+        response = self.post("lost")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        saved = IdempotencyKey.objects.get()
+        self.assertEqual(saved.status_code, 201)
+        self.assertGreater(
+            saved.created, timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(self.post("lost")["Idempotent-Replayed"], "true")
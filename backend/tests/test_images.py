@@ -0,0 +1,59 @@
+import base64
+import shutil
+from io import BytesIO
+from tempfile import mkdtemp
+
+from django.test import override_settings
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.storage import content_storage
+from tests.base import BaseTestCase
+
+ORIENTATION = 0x0112
+GPS_INFO = 0x8825
+
+
+class RecipeImageTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = self.create_user("author")
+        self.recipe = self.create_recipe(self.author, "soup")
+        self.ingredient = self.create_ingredient("соль")
+        self.client.force_authenticate(self.author)
+
+    def make_photo(self):
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[GPS_INFO] = {1: "N", 2: (55.0, 45.0, 21.0)}
+        buffer = BytesIO()
+        Image.new("RGB", (40, 20), "red").save(buffer, "JPEG", exif=exif)
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    def test_original_is_stored_without_exif(self):
+        response = self.client.post(
+            "/api/recipes/",
+            {
+                "ingredients": [{"id": self.ingredient.pk, "amount": 5}],
+                "tags": [self.recipe.tags.get().pk],
+                "image": f"data:image/jpeg;base64,{self.make_photo()}",
+                "name": "борщ",
+                "text": "борщ",
+                "cooking_time": 30,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        name = Recipe.objects.get(pk=response.json()["id"]).image.name
+        self.assertTrue(response.json()["image"].endswith(name))
+        with content_storage.open(name) as file:
+            image = Image.open(file)
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertNotIn("exif", image.info)
@@ -0,0 +1,119 @@
+import csv
+import os
+import shutil
+from io import StringIO
+from tempfile import mkdtemp
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from api.management.commands.importcsv import Command, RowsFile
+from recipes.models import Ingredient, Tag
+from tests.base import BaseTestCase
+
+
+class ImportCsvTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        patcher = mock.patch.object(
+            Command,
+            "get_csv_file",
+            lambda command, filename: os.path.join(self.root, filename),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_import(self, model_name, content):
+        with open(
+            os.path.join(self.root, "import.csv"), "w", encoding="utf-8"
+        ) as csv_file:
+            csv_file.write(content)
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "importcsv",
+            filename="import.csv",
+            model_name=model_name,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_rerun_changes_nothing(self):
+        content = "мука,г\nмолоко,мл\n"
+        output, _ = self.run_import("Ingredient", content)
+        self.assertIn("строк 2, добавлено 2, обновлено 0", output)
+        pks = set(Ingredient.objects.values_list("pk", flat=True))
+
+        output, _ = self.run_import("Ingredient", content)
+        self.assertIn("строк 2, добавлено 0, обновлено 0", output)
+        self.assertEqual(
+            set(Ingredient.objects.values_list("pk", flat=True)), pks
+        )
+
+    def test_changed_rows_are_updated_in_place(self):
+        self.run_import("Tag", "Обед,#00FF00,lunch\n")
+        tag = Tag.objects.get(slug="lunch")
+
+        output, _ = self.run_import("Tag", "Обед,#0000FF,lunch\n")
+        self.assertIn("добавлено 0, обновлено 1", output)
+        tag.refresh_from_db()
+        self.assertEqual(tag.color, "#0000FF")
+
+    def test_malformed_rows_are_reported(self):
+        output, errors = self.run_import(
+            "Ingredient", "мука,г\nбез единицы\n\nсоль,г,лишнее\n"
+        )
+        self.assertIn("строк 1, добавлено 1", output)
+        self.assertIn("пропущено некорректных 2", output)
+        self.assertIn("Строка 2", errors)
+        self.assertIn("Строка 4", errors)
+        self.assertEqual(
+            list(Ingredient.objects.values_list("name", flat=True)), ["мука"]
+        )
+
+    def test_tag_conflict_is_command_error(self):
+        Tag.objects.create(name="Завтрак", color="#FF0000", slug="breakfast")
+        with self.assertRaises(CommandError):
+            self.run_import(
+                "Tag", "Обед,#00FF00,lunch\nЗавтрак,#0000FF,morning\n"
+            )
+        self.assertEqual(
+            list(Tag.objects.values_list("slug", flat=True)), ["breakfast"]
+        )
+
+    def test_empty_text_field_stays_empty_string(self):
+        self.run_import("Ingredient", "перец,\n")
+        self.assertEqual(
+            Ingredient.objects.get(name="перец").measurement_unit, ""
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY только в PostgreSQL")
+    def test_copy_upsert(self):
+        with mock.patch.object(
+            Command, "batch_upsert", side_effect=AssertionError
+        ):
+            output, errors = self.run_import(
+                "Ingredient",
+                'мука,г\n"соль, морская",г\nплохая\nмука,г\nперец,\n',
+            )
+        self.assertIn("Загружено строк: 3", output)
+        self.assertIn("добавлено 3", output)
+        self.assertIn("Строка 3", errors)
+        self.assertEqual(
+            set(Ingredient.objects.values_list("name", flat=True)),
+            {"мука", "соль, морская", "перец"},
+        )
+        self.assertEqual(
+            Ingredient.objects.get(name="перец").measurement_unit, ""
+        )
+
+
+class RowsFileTests(BaseTestCase):
+    def test_read_in_chunks(self):
+        rows = [["мука", 'сорт "высший"'], ["соль, морская", "г"]] * 100
+        rows_file = RowsFile(iter(rows))
+        chunks = iter(lambda: rows_file.read(7), "")
+        self.assertEqual(list(csv.reader(StringIO("".join(chunks)))), rows)
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.utils import bulk_insert_ignore, update_counters
+from recipes.models import Favorites, Recipe
+from tests.base import BaseTestCase
+
+
+class BulkFavoriteTests(BaseTestCase):
+    url = "/api/recipes/favorite/"
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        author = self.create_user("author")
+        self.first = self.create_recipe(author, "first")
+        self.second = self.create_recipe(author, "second")
+        self.client.force_authenticate(self.user)
+
+    def get_counters(self):
+        return dict(
+            Recipe.objects.filter(
+                pk__in=(self.first.pk, self.second.pk)
+            ).values_list("pk", "favorites_count")
+        )
+
+    def get_statuses(self, response):
+        return {row["id"]: row["status"] for row in response.json()["results"]}
+
+    def test_bulk_add_counts_each_recipe_once(self):
+        ids = [self.first.pk, self.second.pk, self.first.pk, 999999]
+        response = self.client.post(self.url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get_statuses(response),
+            {
+                self.first.pk: "created",
+                self.second.pk: "created",
+                999999: "not_found",
+            },
+        )
+        response = self.client.post(self.url, {"ids": ids}, format="json")
+        self.assertEqual(
+            self.get_statuses(response)[self.first.pk], "exists"
+        )
+        self.assertEqual(
+            self.get_counters(), {self.first.pk: 1, self.second.pk: 1}
+        )
+
+    def test_bulk_add_skips_concurrently_inserted_link(self):
+        def insert_concurrently(objs, *args):
+            Favorites.objects.create(user=self.user, recipe=self.first)
+            update_counters(Recipe, (self.first.pk,), "favorites_count", 1)
+            return bulk_insert_ignore(objs, *args)
+
+        with mock.patch(
+            "api.mixins.bulk_insert_ignore", side_effect=insert_concurrently
+        ):
+            response = self.client.post(
+                self.url,
+                {"ids": [self.first.pk, self.second.pk]},
+                format="json",
+            )
+        self.assertEqual(
+            self.get_statuses(response),
+            {self.first.pk: "exists", self.second.pk: "created"},
+        )
+        self.assertEqual(
+            self.get_counters(), {self.first.pk: 1, self.second.pk: 1}
+        )
+
+    def test_bulk_add_query_count_does_not_grow(self):
+        author = self.create_user("prolific")
+        flour = self.create_ingredient("мука")
+        recipes = [
+            self.create_recipe(author, f"recipe {number}", {flour: number + 1})
+            for number in range(20)
+        ]
+
+        def count_queries(url, ids):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {"ids": ids}, format="json")
+            self.assertEqual(
+                set(self.get_statuses(response).values()), {"created"}
+            )
+            return len(queries)
+
+        for url in (self.url, "/api/recipes/shopping_cart/"):
+            with self.subTest(url=url):
+                first, second, *rest = recipes
+                count_queries(url, [first.pk])
+                self.assertEqual(
+                    count_queries(url, [second.pk]),
+                    count_queries(url, [recipe.pk for recipe in rest]),
+                )
+
+    def test_bulk_remove_counts_only_deleted_links(self):
+        self.client.post(self.url, {"ids": [self.first.pk]}, format="json")
+        ids = [self.first.pk, self.second.pk]
+        response = self.client.delete(self.url, {"ids": ids}, format="json")
+        self.assertEqual(
+            self.get_statuses(response),
+            {self.first.pk: "deleted", self.second.pk: "absent"},
+        )
+        response = self.client.delete(self.url, {"ids": ids}, format="json")
+        self.assertEqual(
+            self.get_statuses(response),
+            {self.first.pk: "absent", self.second.pk: "absent"},
+        )
+        self.assertEqual(
+            self.get_counters(), {self.first.pk: 0, self.second.pk: 0}
+        )
+        self.assertFalse(Favorites.objects.filter(user=self.user).exists())
@@ -0,0 +1,167 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from api.constant import RECIPES_VERSION
+from api.models import ShoppingListExport
+from api.shopping import (export_shopping_list, get_shopping_list_name,
+                          get_shopping_list_path)
+from api.versions import bump_version
+from tests.base import BaseTestCase
+
+
+class ShoppingListTestCase(BaseTestCase):
+    url = "/api/recipes/download_shopping_cart/"
+
+    def setUp(self):
+        super().setUp()
+        root = mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(SHOPPING_LIST_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.author = self.create_user("author")
+        self.user = self.create_user("reader")
+        self.flour = self.create_ingredient("мука")
+        self.milk = self.create_ingredient("молоко", "мл")
+        self.recipe = self.create_recipe(
+            self.author, "pancakes", {self.flour: 200, self.milk: 300}
+        )
+        self.other = self.create_recipe(
+            self.author, "porridge", {self.milk: 1}
+        )
+        self.client.force_authenticate(self.user)
+        self.client.post(f"/api/recipes/{self.recipe.pk}/shopping_cart/")
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content)
+        return content
+
+    def edit_recipe(self, amounts):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f"/api/recipes/{self.recipe.pk}/",
+            {
+                "name": self.recipe.name,
+                "text": self.recipe.text,
+                "cooking_time": self.recipe.cooking_time,
+                "tags": list(self.recipe.tags.values_list("pk", flat=True)),
+                "ingredients": [
+                    {"id": ingredient.pk, "amount": amount}
+                    for ingredient, amount in amounts.items()
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.user)
+
+
+class ShoppingListTests(ShoppingListTestCase):
+    def test_unrelated_changes_keep_cached_file(self):
+        name = get_shopping_list_name(self.user)
+        content = self.download()
+        bump_version(RECIPES_VERSION)
+        self.create_recipe(self.author, "soup", {self.flour: 1})
+        self.assertEqual(get_shopping_list_name(self.user), name)
+        self.assertEqual(self.download(), content)
+
+    def test_editing_recipe_in_cart_rebuilds_file(self):
+        name = get_shopping_list_name(self.user)
+        self.download()
+        self.edit_recipe({self.flour: 250, self.milk: 300})
+        self.assertNotEqual(get_shopping_list_name(self.user), name)
+        self.download()
+        self.assertFalse(os.path.exists(get_shopping_list_path(name)))
+
+    def test_text_list_is_sorted_and_normalized(self):
+        self.client.post(f"/api/recipes/{self.other.pk}/shopping_cart/")
+        self.edit_recipe({self.flour: 200, self.milk: 1499})
+        response = self.client.get(self.url, {"format": "txt"})
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(),
+            "молоко: 1.5 л\nмука: 200 г\n",
+        )
+
+    def test_removed_file_is_rebuilt(self):
+        self.download()
+        os.remove(get_shopping_list_path(get_shopping_list_name(self.user)))
+        self.assertTrue(self.download().startswith(b"%PDF"))
+
+
+@override_settings(SHOPPING_LIST_SYNC_LIMIT=0)
+class ShoppingListExportTests(ShoppingListTestCase):
+    def start(self):
+        with mock.patch("api.shopping.submit_to_pool") as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(self.url)
+        return response, submit
+
+    def poll(self, url):
+        with mock.patch("api.shopping.submit_to_pool") as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url)
+        return response, submit
+
+    def test_export_status_survives_cache_clear(self):
+        response, submit = self.start()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+        submit.assert_called_once()
+        url = response.json()["url"]
+
+        cache.clear()
+        response, submit = self.poll(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+        submit.assert_not_called()
+
+        export_shopping_list(self.user.pk, get_shopping_list_name(self.user))
+        response, _ = self.poll(url)
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content)
+        self.assertTrue(content.startswith(b"%PDF"))
+
+    def test_failed_export_is_reported(self):
+        response, _ = self.start()
+        url = response.json()["url"]
+        with mock.patch(
+            "api.shopping.build_shopping_list", side_effect=OSError
+        ), self.assertLogs("api.shopping", "ERROR"):
+            export_shopping_list(
+                self.user.pk, get_shopping_list_name(self.user)
+            )
+
+        response, submit = self.poll(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "failed")
+        submit.assert_not_called()
+
+        response, submit = self.start()
+        self.assertEqual(response.status_code, 202)
+        submit.assert_called_once()
+
+    def test_lost_export_is_restarted(self):
+        response, _ = self.start()
+        ShoppingListExport.objects.all().delete()
+
+        response, submit = self.poll(response.json()["url"])
+        self.assertEqual(response.status_code, 202)
+        submit.assert_called_once()
+        self.assertTrue(ShoppingListExport.objects.filter(user=self.user))
+
+    def test_changed_cart_replaces_export(self):
+        self.start()
+        self.client.post(f"/api/recipes/{self.other.pk}/shopping_cart/")
+        self.start()
+        self.assertEqual(
+            list(ShoppingListExport.objects.values_list("name", flat=True)),
+            [get_shopping_list_name(self.user)],
+        )
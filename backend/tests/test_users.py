@@ -0,0 +1,71 @@
+from tests.base import BaseTestCase
+from users.models import CustomUser
+
+
+class UserDeleteTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.user = self.create_user("reader")
+        self.recipe = self.create_recipe(self.author, "pancakes")
+        self.client.force_authenticate(self.user)
+        for url in (
+            f"/api/recipes/{self.recipe.pk}/favorite/",
+            f"/api/recipes/{self.recipe.pk}/shopping_cart/",
+            f"/api/users/{self.author.pk}/subscribe/",
+        ):
+            self.assertEqual(self.client.post(url).status_code, 201)
+
+    def test_self_delete_recounts_linked_counters(self):
+        response = self.client.delete(
+            "/api/users/me/", {"current_password": "password"}, format="json"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.carts_count), (0, 0)
+        )
+        self.assertEqual(self.author.subscribers_count, 0)
+
+
+class AuthorEmailTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.recipe = self.create_recipe(self.author, "pancakes")
+
+    def set_email(self, email):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(
+            "/api/users/set_email/",
+            {"new_email": email, "current_password": "password"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.client.force_authenticate(None)
+
+    def test_set_email_updates_cached_recipes(self):
+        url = f"/api/recipes/{self.recipe.pk}/"
+        self.assertEqual(
+            self.client.get(url).json()["author"]["email"],
+            "author@example.com",
+        )
+        self.set_email("new@example.com")
+        self.assertEqual(
+            self.client.get(url).json()["author"]["email"], "new@example.com"
+        )
+
+    def test_set_email_invalidates_recipe_etags(self):
+        etags = {}
+        for url in ("/api/recipes/", f"/api/recipes/{self.recipe.pk}/"):
+            etags[url] = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 304)
+        self.set_email("new@example.com")
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("new@example.com", response.content.decode())
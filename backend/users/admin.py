@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.contrib.admin import register
 from django.contrib.auth.admin import UserAdmin
+from django.db import transaction
 
+from api.feed import subscribe_feed, trim_feed, update_feed_modes
+from api.mixins import CounterAdminMixin, UserVersionAdminMixin
+from api.utils import get_user_links, touch_author_recipes, user_links_deleted
 from users.forms import CustomUserCreationForm
 from users.models import CustomUser, Subscriptions
 
@@ -15,6 +19,8 @@ class CustomUserAdmin(UserAdmin):
         "first_name",
         "last_name",
         "email",
+        "recipes_count",
+        "subscribers_count",
     )
     search_fields = (
         "username",
@@ -30,9 +36,28 @@ class CustomUserAdmin(UserAdmin):
     empty_value_display = "-пусто-"
     save_on_top = True
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            touch_author_recipes([obj])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            links = get_user_links(CustomUser.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+            user_links_deleted(links)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            links = get_user_links(queryset)
+            super().delete_queryset(request, queryset)
+            user_links_deleted(links)
+
 
 @register(Subscriptions)
-class SubscriptionsAdmin(admin.ModelAdmin):
+class SubscriptionsAdmin(
+    CounterAdminMixin, UserVersionAdminMixin, admin.ModelAdmin
+):
     list_display = (
         "user",
         "author",
@@ -46,3 +71,27 @@ class SubscriptionsAdmin(admin.ModelAdmin):
         "author",
     )
     empty_value_display = "-пусто-"
+    counters = {"author": "subscribers_count"}
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            trim_feed(form.initial["user"], form.initial["author"])
+            update_feed_modes((form.initial["author"],))
+        subscribe_feed(obj.user, obj.author)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.subscriptions_deleted([obj])
+
+    def delete_queryset(self, request, queryset):
+        subscriptions = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.subscriptions_deleted(subscriptions)
+
+    def subscriptions_deleted(self, subscriptions):
+        for subscription in subscriptions:
+            trim_feed(subscription.user_id, subscription.author_id)
+        update_feed_modes(
+            {subscription.author_id for subscription in subscriptions}
+        )
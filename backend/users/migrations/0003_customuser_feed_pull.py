@@ -0,0 +1,26 @@
+# Generated by Django 3.2.4 on 2026-10-18 02:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_feed_pull(apps, schema_editor):
+    apps.get_model('users', 'CustomUser').objects.filter(
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(feed_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='feed_pull',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ленты без рассылки'),
+        ),
+        migrations.RunPython(fill_feed_pull, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MaxLengthValidator
-from django.db.models import (CASCADE, CharField, CheckConstraint, EmailField,
-                              F, ForeignKey, Model, Q, UniqueConstraint)
+from django.db.models import (CASCADE, BooleanField, CharField,
+                              CheckConstraint, EmailField, F, ForeignKey,
+                              Model, PositiveIntegerField, Q, UniqueConstraint)
 
 from .validators import valid_username
 
@@ -47,6 +48,21 @@ class CustomUser(AbstractUser):
         max_length=150,
         help_text="Обязательное для заполнения поле. Максимум 150 символов.",
     )
+    recipes_count = PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    subscribers_count = PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
+    feed_pull = BooleanField(
+        verbose_name="Ленты без рассылки",
+        default=False,
+        editable=False,
+    )
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = (
         "username",